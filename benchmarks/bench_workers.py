@@ -0,0 +1,38 @@
+# bench_workers.py
+"""
+Scaling curve of read_and_parse_messages over 1/2/4/8 worker processes.
+
+Usage: python -m benchmarks.bench_workers [--files 8] [--messages 50000]
+"""
+
+import argparse
+import tempfile
+import time
+from benchmarks.corpus import generate_corpus
+from utils.data_extraction import read_and_parse_messages
+
+KEYWORDS = ['借记卡', '收入', '交易', '支付', '支取', '余额', '转存', '转支', '存款', '金额']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=50000, help='messages per file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as message_dir:
+        generate_corpus(message_dir, args.files, args.messages)
+        reference = None
+        print(f"{'workers':>8} {'seconds':>10} {'speedup':>8}")
+        for workers in (1, 2, 4, 8):
+            start = time.perf_counter()
+            transactions = read_and_parse_messages(message_dir, 2016, KEYWORDS, workers=workers)
+            elapsed = time.perf_counter() - start
+            if reference is None:
+                reference, baseline = transactions, elapsed
+            assert transactions == reference, f'output with {workers} workers differs from the serial run'
+            print(f"{workers:>8} {elapsed:>10.3f} {baseline / elapsed:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# corpus.py
+"""
+Synthetic SMS corpus generator for benchmarks and regression runs.
+
+Every export is chronological and spans several years, so the year inference in
+read_and_sort_messages has to roll over; it starts with the export timestamp line
+('YYYY-MM-DD ...') that calibrates the year. Messages use the Agricultural Bank of
+China and Bank of China formats of example.txt and can carry missing balances,
+planted balance discrepancies and irrelevant notices.
+
+Usage: python -m benchmarks.corpus <message_dir> [--files 4] [--messages 100000]
+"""
+
+import argparse
+import os
+import random
+import shutil
+
+
+COUNTERPARTIES = ['陈晓明', '何厚铧', '李四', '王芳', '张伟', '刘洋', '支付宝', '财付通']
+BOC_CHANNELS = ['网上支付', 'ATM', '快捷支付', '柜台']
+
+
+def make_accounts(rng, n_accounts):
+    """
+    Picks n_accounts distinct 4-digit account numbers, alternating ABC and BOC, with opening balances.
+    Returns:
+        dict: account number -> {'bank': 'abc' or 'boc', 'balance': float}
+    """
+    numbers = rng.sample(range(1000, 10000), n_accounts)
+    return {
+        str(number): {'bank': 'abc' if i % 2 == 0 else 'boc', 'balance': round(rng.uniform(500, 20000), 2)}
+        for i, number in enumerate(numbers)
+    }
+
+
+def format_message(rng, account_number, bank, month, day, amount, balance, income, missing_balance):
+    """
+    Renders one transaction SMS in the ABC or BOC format of example.txt.
+    """
+    time_of_day = f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"
+    if bank == 'boc':
+        kind = '收入' if income else '支取'
+        channel = rng.choice(BOC_CHANNELS)
+        unit = '元' if rng.random() < 0.8 else ''
+        return (f"您的借记卡账户{account_number}，于{month:02d}月{day:02d}日{channel}{kind}人民币{amount:.2f}{unit},"
+                f"交易后余额{balance:.2f}【中国银行】")
+    counterparty = rng.choice(COUNTERPARTIES)
+    tail = '。' if missing_balance else f"，余额{balance:.2f}。"
+    if income:
+        return (f"【中国农业银行】{counterparty}于{month:02d}月{day:02d}日{time_of_day}向您尾号{account_number}账户"
+                f"完成转存交易人民币{amount:.2f}{tail}")
+    return (f"【中国农业银行】您尾号{account_number}账户{month:02d}月{day:02d}日{time_of_day}向{counterparty}"
+            f"完成转支交易人民币-{amount:.2f}{tail}")
+
+
+def generate_file(file_path, n_messages, start_year=2018, seed=0, n_accounts=2,
+                  missing_balance_rate=0.0, discrepancy_rate=0.0, noise_rate=0.0, messages_per_day=3.0):
+    """
+    Writes a synthetic, chronological SMS export in the formats of example.txt.
+    Args:
+        file_path (str): The file to write.
+        n_messages (int): The number of transaction messages to generate.
+        start_year (int): The year of the first message.
+        seed (int): The random seed, so every corpus is reproducible.
+        n_accounts (int): The number of accounts, alternating between ABC and BOC.
+        missing_balance_rate (float): Share of ABC messages written without a balance.
+        discrepancy_rate (float): Share of messages whose reported balance is off by a random amount.
+        noise_rate (float): Share of extra, non-transaction notices mixed into the export.
+        messages_per_day (float): Average number of messages per day, which sets how many years are covered.
+    Returns:
+        int: The year of the last message, written as the export timestamp.
+    """
+    rng = random.Random(seed)
+    accounts = make_accounts(rng, n_accounts)
+    account_numbers = list(accounts)
+    year, month, day = start_year, 1, 1
+    body_path = file_path + '.body'
+    with open(body_path, 'w', encoding='utf-8') as file:
+        for _ in range(n_messages):
+            if rng.random() < 1 / messages_per_day:
+                day += 1
+                if day > 28:
+                    day, month = 1, month + 1
+                    if month > 12:
+                        month, year = 1, year + 1
+            if rng.random() < noise_rate:
+                file.write(f"【中国银行】{month:02d}月{day:02d}日起手机银行服务升级，详询95566。\n"
+                           if rng.random() < 0.5 else f"您的验证码为{rng.randint(100000, 999999)}，请勿泄露。\n")
+            account_number = rng.choice(account_numbers)
+            account = accounts[account_number]
+            amount = round(rng.uniform(1, 500), 2)
+            income = rng.random() < 0.5
+            # Balances never go negative: the balance pattern cannot read a minus sign, such rows
+            # would parse as missing balances and leave the fast path.
+            if not income and account['balance'] < amount:
+                income = True
+            account['balance'] = round(account['balance'] + (amount if income else -amount), 2)
+            balance = account['balance']
+            if rng.random() < discrepancy_rate:
+                balance = abs(balance + rng.choice([-1, 1]) * round(rng.uniform(0.01, 50), 2))
+            missing_balance = account['bank'] == 'abc' and rng.random() < missing_balance_rate
+            file.write(format_message(rng, account_number, account['bank'], month, day, amount, balance,
+                                      income, missing_balance) + '\n')
+
+    # The export timestamp comes first and calibrates the year inference.
+    with open(file_path, 'w', encoding='utf-8') as file, open(body_path, 'r', encoding='utf-8') as body:
+        file.write(f"{year}-{month:02d}-{day:02d} 短信导出\n")
+        shutil.copyfileobj(body, file)
+    os.remove(body_path)
+    return year
+
+
+def generate_corpus(message_dir, n_files, n_messages, seed=0, **options):
+    """
+    Writes n_files synthetic exports of n_messages messages each into message_dir.
+    Extra keyword options are passed on to generate_file.
+    """
+    os.makedirs(message_dir, exist_ok=True)
+    for i in range(n_files):
+        generate_file(os.path.join(message_dir, f'export_{i:03d}.txt'), n_messages, seed=seed + i, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('message_dir')
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=100000, help='messages per file')
+    parser.add_argument('--accounts', type=int, default=4, help='accounts per file')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--missing-balance-rate', type=float, default=0.02)
+    parser.add_argument('--discrepancy-rate', type=float, default=0.01)
+    parser.add_argument('--noise-rate', type=float, default=0.05)
+    args = parser.parse_args()
+    generate_corpus(args.message_dir, args.files, args.messages, seed=args.seed, n_accounts=args.accounts,
+                    missing_balance_rate=args.missing_balance_rate, discrepancy_rate=args.discrepancy_rate,
+                    noise_rate=args.noise_rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+# golden.py
+"""
+Regression harness: runs the pipeline over a fixed corpus and diffs the reports against golden results.
+
+Every case is a small, fixed message directory: example.txt on its own, the edge messages of
+benchmarks.parser_parity, seeded synthetic exports (see benchmarks.corpus) with missing balances,
+planted discrepancies, notices and year roll-overs, example.txt mixed into generated exports, and a
+generated export next to a partial copy of itself that starts mid-day. Each case runs in two modes:
+
+- legacy: the original batch pipeline, rebuilt from the pieces that predate the rewrites: plain
+  text reads, one sort of all messages on datetime dates, a substring keyword filter, the generic
+  regex cascade (parse_generic) for every message, verify_transactions on all accounts at once and
+  the 'standard' xlsx writer of generate_csv_files, all in one process. It shares no code with the
+  bulk reader, the date-key merge, the keyword prefilter or the bank fast paths, so a regression
+  in any of those shows up as a fast-vs-legacy difference;
+- fast: read_and_parse_messages and verify_and_export, one task per account, with the 'fast'
+  xlsx writer, on --workers processes. In the overlap case the fast mode also reads the partial
+  copy and deduplicates, while the legacy mode reads the full export only, so the copy has to be
+  dropped without changing the order of the kept transactions.
+
+The written reports are read back and normalised per account (numbers to the cent, empty cells as
+'') and compared field by field with benchmarks/golden/<case>.json and with each other; the stage
+timings of both modes are printed next to the diff. Any mismatch exits with status 1. After an
+intended change of the results, --update rewrites the golden files from the legacy mode.
+
+Usage: python -m benchmarks.golden [--workers 2] [--cases example generated] [--update]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from benchmarks.corpus import generate_corpus
+from benchmarks.parser_parity import EDGE_MESSAGES
+from utils.data_extraction import list_message_files, iter_year_messages, read_and_parse_messages
+from utils.data_verification import verify_transactions
+from utils.dedup import DEFAULT_RULES
+from utils.parsers import DATE_RE, FIELDS, parse_generic
+from utils.report_generation import generate_csv_files
+from utils.scheduler import verify_and_export
+from utils.util import parse_date
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_DIR = os.path.join(REPO_DIR, 'benchmarks', 'golden')
+EXAMPLE_FILE = os.path.join(REPO_DIR, 'example.txt')
+KEYWORDS = ['借记卡', '收入', '交易', '支付', '支取', '余额', '转存', '转支', '存款', '金额']
+INITIAL_YEAR = 2016
+THRESHOLD = 10
+# Mismatches printed per case and mode, the count is always reported in full.
+SHOW_MISMATCHES = 10
+
+# case name -> (extra files: 'example', 'edge' and/or 'overlap', generate_corpus options or None). Keep them
+# small: the golden files are committed, and fixed seeds make every corpus byte-identical from run to run.
+CASES = {
+    'example': (['example'], None),
+    'edge': (['edge'], None),
+    'generated': ([], dict(n_files=2, n_messages=300, seed=100, n_accounts=3, missing_balance_rate=0.05,
+                              discrepancy_rate=0.03, noise_rate=0.05)),
+    'year_rollover': ([], dict(n_files=1, n_messages=300, seed=200, n_accounts=2, messages_per_day=0.3,
+                                  missing_balance_rate=0.1, discrepancy_rate=0.02)),
+    'mixed': (['example'], dict(n_files=2, n_messages=150, seed=300, n_accounts=2, missing_balance_rate=0.05,
+                         discrepancy_rate=0.05, noise_rate=0.1)),
+    'overlap': (['overlap'], dict(n_files=1, n_messages=300, seed=400, n_accounts=3, messages_per_day=4,
+                                  missing_balance_rate=0.05, discrepancy_rate=0.02)),
+}
+# The lines of the first generated export the overlap copy holds, after its header line; the copy
+# starts in the middle of a day. The results must not depend on which of the two files is listed first.
+OVERLAP_LINES = slice(150, 300)
+OVERLAP_FILE = 'export_000_partial.txt'
+
+
+def build_case(name, message_dir):
+    """
+    Writes the message files of one case into message_dir.
+    """
+    extra_files, options = CASES[name]
+    os.makedirs(message_dir, exist_ok=True)
+    if 'example' in extra_files:
+        shutil.copy(EXAMPLE_FILE, os.path.join(message_dir, 'example.txt'))
+    if 'edge' in extra_files:
+        with open(os.path.join(message_dir, 'edge.txt'), 'w', encoding='utf-8') as file:
+            file.writelines(message + '\n' for message in EDGE_MESSAGES)
+    if options:
+        options = dict(options)
+        generate_corpus(message_dir, options.pop('n_files'), options.pop('n_messages'), **options)
+
+
+def add_overlap(message_dir):
+    """
+    Writes OVERLAP_FILE: the header line and OVERLAP_LINES of the first generated export, as a
+    second export of the same phone taken from mid-day on would contain them.
+    """
+    with open(os.path.join(message_dir, 'export_000.txt'), 'r', encoding='utf-8') as file:
+        lines = file.readlines()
+    with open(os.path.join(message_dir, OVERLAP_FILE), 'w', encoding='utf-8') as file:
+        file.writelines([lines[0]] + lines[OVERLAP_LINES])
+
+
+def timed(timings, stage, function, *args, **kwargs):
+    """
+    Calls function and records its wall time in timings[stage].
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    timings[stage] = time.perf_counter() - start
+    return result
+
+
+def read_messages_legacy(message_dir):
+    """
+    The original read_and_sort_messages: every file read in text mode, the year inferred per line,
+    and all messages sorted at once on their datetime date.
+    """
+    messages = []
+    for file_name in list_message_files(message_dir):
+        with open(os.path.join(message_dir, file_name), 'r', encoding='utf-8') as file:
+            messages.extend(iter_year_messages(file.readlines(), INITIAL_YEAR))
+    return sorted(messages, key=lambda message: parse_date(DATE_RE.search(message[0]).group(), message[1]))
+
+
+def extract_legacy(messages):
+    """
+    The original extract_messages and extract_details: a substring test per keyword, then the
+    generic regex cascade for every message. Messages it cannot parse are skipped, as parse_message
+    skips them.
+    """
+    transactions = []
+    for message, year in messages:
+        if any(keyword in message for keyword in KEYWORDS):
+            try:
+                transactions.append(parse_generic(message, year))
+            except (AttributeError, ValueError):
+                pass
+    return transactions
+
+
+def run_legacy(message_dir, output_dir):
+    """
+    The original batch pipeline of main.py, see the module docstring.
+    Returns:
+        dict: stage name -> seconds.
+    """
+    timings = {}
+    messages = timed(timings, 'read_and_sort_messages', read_messages_legacy, message_dir)
+    transactions = timed(timings, 'extract_details', extract_legacy, messages)
+    verified = timed(timings, 'verify_transactions', verify_transactions, transactions, THRESHOLD)
+    timed(timings, 'generate_csv_files', generate_csv_files, verified, output_dir, mode='standard')
+    return timings
+
+
+def run_fast(message_dir, output_dir, workers, dedup=None):
+    """
+    The per-file parse, the per-account verification and the 'fast' reports, as main.py --workers runs them.
+    dedup: the deduplication rules, if any.
+    Returns:
+        dict: stage name -> seconds.
+    """
+    config = {'output_dir': output_dir, 'threshold': THRESHOLD, 'sinks': ['xlsx'],
+              'report_mode': 'fast'}
+    timings = {}
+    transactions = timed(timings, 'read_and_parse_messages', read_and_parse_messages,
+                         message_dir, INITIAL_YEAR, KEYWORDS, workers=workers, dedup=dedup)
+    timed(timings, 'verify_and_export', verify_and_export, transactions, config, workers=workers)
+    return timings
+
+
+def normalise_cell(value):
+    """
+    Numbers to the cent (verification carries accumulated floats, openpyxl reads 100.0 back as 100),
+    empty cells as ''.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return '{:.2f}'.format(value)
+    return str(value)
+
+
+def read_reports(output_dir):
+    """
+    Reads the per-account reports of output_dir back.
+    Returns:
+        dict: account number -> list of rows, each a list of normalised cells in FIELDS order.
+    """
+    import openpyxl
+
+    results = {}
+    for file_name in sorted(os.listdir(output_dir)):
+        if not (file_name.startswith('账户') and file_name.endswith('.xlsx')):
+            continue
+        workbook = openpyxl.load_workbook(os.path.join(output_dir, file_name), read_only=True)
+        try:
+            rows = workbook.active.iter_rows(min_row=2, values_only=True)
+            results[file_name[len('账户'):-len('.xlsx')]] = [[normalise_cell(value) for value in row] for row in rows]
+        finally:
+            workbook.close()
+    return results
+
+
+def diff_results(expected, actual):
+    """
+    Compares two read_reports results field by field.
+    Returns:
+        list: One line per difference: a missing or extra account, a row count or a field.
+    """
+    differences = []
+    for account in sorted(set(expected) | set(actual)):
+        if account not in actual:
+            differences.append(f"account {account}: missing")
+            continue
+        if account not in expected:
+            differences.append(f"account {account}: unexpected")
+            continue
+        want, got = expected[account], actual[account]
+        if len(want) != len(got):
+            differences.append(f"account {account}: {len(want)} rows expected, {len(got)} written")
+        for i, (want_row, got_row) in enumerate(zip(want, got)):
+            for field, want_value, got_value in zip(FIELDS, want_row, got_row):
+                if want_value != got_value:
+                    differences.append(f"account {account} row {i + 1} {field}: {want_value!r} != {got_value!r}")
+    return differences
+
+
+def format_timings(timings):
+    return ', '.join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in timings.items()) + \
+        f" (total {sum(timings.values()) * 1000:.1f}ms)"
+
+
+def run_case(name, workers, update):
+    """
+    Runs one case in both modes and prints the diff against the golden file and between the modes.
+    Returns:
+        bool: True if everything matched.
+    """
+    golden_path = os.path.join(GOLDEN_DIR, f'{name}.json')
+    with tempfile.TemporaryDirectory() as work_dir:
+        message_dir = os.path.join(work_dir, 'messages')
+        build_case(name, message_dir)
+        fast_dir, dedup = message_dir, None
+        if 'overlap' in CASES[name][0]:
+            fast_dir, dedup = os.path.join(work_dir, 'messages_overlap'), DEFAULT_RULES
+            shutil.copytree(message_dir, fast_dir)
+            add_overlap(fast_dir)
+        results, timings = {}, {}
+        for mode in ('legacy', 'fast'):
+            output_dir = os.path.join(work_dir, mode)
+            os.makedirs(output_dir)
+            if mode == 'legacy':
+                timings[mode] = run_legacy(message_dir, output_dir)
+            else:
+                timings[mode] = run_fast(fast_dir, output_dir, workers, dedup)
+            results[mode] = read_reports(output_dir)
+
+    if update:
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        with open(golden_path, 'w', encoding='utf-8') as file:
+            json.dump({'fields': FIELDS, 'accounts': results['legacy']}, file, ensure_ascii=False, indent=0)
+            file.write('\n')
+    if not os.path.exists(golden_path):
+        print(f"{name}: no golden file {os.path.relpath(golden_path, REPO_DIR)}, run with --update first")
+        return False
+    with open(golden_path, 'r', encoding='utf-8') as file:
+        golden = json.load(file)
+    if golden['fields'] != FIELDS:
+        print(f"{name}: golden fields {golden['fields']} differ from {FIELDS}, run with --update")
+        return False
+
+    rows = sum(len(account_rows) for account_rows in golden['accounts'].values())
+    print(f"{name}: {len(golden['accounts'])} accounts, {rows} rows")
+    matched = True
+    comparisons = [('legacy', golden['accounts'], results['legacy']),
+                   ('fast', golden['accounts'], results['fast']),
+                   ('fast vs legacy', results['legacy'], results['fast'])]
+    for label, expected, actual in comparisons:
+        differences = diff_results(expected, actual)
+        timing = f" [{format_timings(timings[label])}]" if label in timings else ''
+        print(f"  {label}: {'ok' if not differences else f'{len(differences)} MISMATCHES'}{timing}")
+        for line in differences[:SHOW_MISMATCHES]:
+            print(f"    {line}")
+        matched = matched and not differences
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='processes of the fast mode')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--update', action='store_true',
+                        help='rewrite the golden files from the legacy mode before comparing')
+    args = parser.parse_args()
+
+    results = [run_case(name, args.workers, args.update) for name in args.cases]
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# parser_parity.py
+"""
+Checks that the bank fast paths of utils.parsers yield the same fields as the generic cascade.
+
+Runs every line of example.txt, a list of edge messages (counterparties containing 向, 于, 完,
+digits or 人民币, missing balances, odd punctuation) and a synthetic corpus through parse_message
+and parse_generic and reports every field they disagree on. Messages the fast paths do not match
+fall through to the cascade anyway; the counts show how many were fast-path hits.
+
+Usage: python -m benchmarks.parser_parity [--messages 20000]
+"""
+
+import argparse
+import os
+import tempfile
+from benchmarks.corpus import generate_corpus
+from utils.parsers import FIELDS, parse_message, parse_generic, get_parser_stats, reset_parser_stats
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EDGE_MESSAGES = [
+    # 向 is a common surname, the cascade takes object2 from the first 向.
+    '【中国农业银行】向华强于01月22日17:03向您尾号2222账户完成转存交易人民币100.00，余额2100.00。',
+    '【中国农业银行】您尾号2222账户01月24日23:03向向华强完成转支交易人民币-200.00，余额1800.00。',
+    '【中国农业银行】您尾号2222账户01月24日23:03向华向强完成转支交易人民币-200.00，余额1800.00。',
+    # 于, 完 and 成 inside a counterparty.
+    '【中国农业银行】于小明于02月03日08:15向您尾号2222账户完成转存交易人民币50.00，余额1850.00。',
+    '【中国农业银行】您尾号2222账户02月04日09:00向于丹完成转支交易人民币-30.00，余额1820.00。',
+    '【中国农业银行】您尾号2222账户02月05日10:00向完美公司完成转支交易人民币-30.00，余额1790.00。',
+    '【中国农业银行】成龙于02月06日11:00向您尾号2222账户完成转存交易人民币10.00，余额1800.00。',
+    # Digits, 账, 人民币 and 余额 inside a counterparty.
+    '【中国农业银行】7天酒店于02月07日12:00向您尾号2222账户完成转存交易人民币20.00，余额1820.00。',
+    '【中国农业银行】您尾号2222账户02月08日13:00向7天酒店完成转支交易人民币-20.00，余额1800.00。',
+    '【中国农业银行】账房先生于02月09日14:00向您尾号2222账户完成转存交易人民币20.00，余额1820.00。',
+    '【中国农业银行】您尾号2222账户02月10日15:00向人民币兑换点完成转支交易人民币-20.00，余额1800.00。',
+    '【中国农业银行】您尾号2222账户02月11日16:00向余额宝完成转支交易人民币-20.00，余额1780.00。',
+    # Missing balance, no time of day, a trailing space.
+    '【中国农业银行】陈晓明于02月12日17:03向您尾号2222账户完成转存交易人民币100.00。',
+    '【中国农业银行】您尾号2222账户02月13日向何厚铧完成转支交易人民币-200.00，余额1680.00。',
+    '【中国农业银行】陈晓明于02月14日17:03向您尾号2222账户完成转存交易人民币100.00，余额1780.00。 ',
+    # Bank of China: without 元, with 向, with a second tag.
+    '您的借记卡账户8811，于03月01日网上支付支取人民币22.95,交易后余额305.72【中国银行】',
+    '您的借记卡账户8811，于03月02日向张三转账支取人民币22.95元,交易后余额282.77【中国银行】',
+    '您的借记卡账户8811，于03月03日ATM收入人民币100.00元,交易后余额382.77【中国银行】【提醒】',
+    '您的借记卡账户8811，于03月04日快捷支付支取人民币-5.00元,交易后余额377.77【中国银行】',
+]
+
+
+def read_corpus_messages(n_messages):
+    """
+    The lines of example.txt and of a synthetic corpus with notices and missing balances.
+    """
+    with open(os.path.join(REPO_DIR, 'example.txt'), 'r', encoding='utf-8') as file:
+        messages = [line.strip() for line in file if line.strip()]
+    with tempfile.TemporaryDirectory() as message_dir:
+        generate_corpus(message_dir, 1, n_messages, seed=7, n_accounts=4, missing_balance_rate=0.05,
+                        discrepancy_rate=0.02, noise_rate=0.05)
+        for file_name in sorted(os.listdir(message_dir)):
+            with open(os.path.join(message_dir, file_name), 'r', encoding='utf-8') as file:
+                messages.extend(line.strip() for line in file if '月' in line)
+    return messages
+
+
+def compare(message):
+    """
+    Returns:
+        list: (field, fast-path value, cascade value) for every field the two parsers disagree on.
+    """
+    try:
+        expected = parse_generic(message, 2016)
+    except (AttributeError, ValueError):
+        expected = None
+    actual = parse_message(message, 2016)
+    if expected is None or actual is None:
+        return [] if expected is actual else [('message', actual, expected)]
+    return [(field, actual[field], expected[field]) for field in FIELDS if actual[field] != expected[field]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000, help='synthetic messages')
+    args = parser.parse_args()
+
+    failed = False
+    for label, messages in (('edge cases', EDGE_MESSAGES), ('corpus', read_corpus_messages(args.messages))):
+        reset_parser_stats()
+        mismatches = [(message, differences) for message in messages for differences in [compare(message)]
+                      if differences]
+        hits = sum(counts['hit'] for counts in get_parser_stats().values())
+        print(f"{label}: {len(messages)} messages, {hits} fast-path hits: "
+              f"{'ok' if not mismatches else f'{len(mismatches)} MISMATCHES'}")
+        for message, differences in mismatches[:10]:
+            print(f"  {message}")
+            for field, actual, expected in differences:
+                print(f"    {field}: fast {actual!r} != generic {expected!r}")
+        failed = failed or bool(mismatches)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+# run.py
+"""
+Times the pipeline stages one by one and end to end on synthetic corpora, and writes the results to JSON.
+
+Each size gets a fresh corpus (see benchmarks.corpus). The stages read_and_sort_messages,
+extract_messages, extract_details, verify_transactions, generate_csv_files, calculate_monthly_totals
+and plot_monthly_totals run in-process,
+each fed with the previous stage's output; the end-to-end run is `python main.py` in a scratch
+directory, so it includes interpreter start-up and imports. Pass --compare with an earlier
+results file to print the ratio of every timing against it.
+
+Usage: python -m benchmarks.run [--sizes 1000 10000 100000] [--output bench.json] [--compare old.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import yaml
+from benchmarks.corpus import generate_corpus
+from utils.data_extraction import read_and_sort_messages, extract_messages, extract_details
+from utils.data_verification import verify_transactions
+from utils.report_generation import generate_csv_files
+from utils.charts import calculate_monthly_totals, plot_monthly_totals
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ['read_and_sort_messages', 'extract_messages', 'extract_details', 'verify_transactions',
+          'generate_csv_files', 'calculate_monthly_totals', 'plot_monthly_totals', 'end_to_end']
+
+
+def make_config(message_dir, output_dir, args):
+    """
+    The config.yaml used for the run: the repository's own settings, pointed at the synthetic corpus,
+    without the cache so every end-to-end run parses everything.
+    """
+    with open(os.path.join(REPO_DIR, 'config.yaml'), 'r', encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+    config.update(message_dir=message_dir, output_dir=output_dir, cache=False)
+    if args.report_mode:
+        config['report_mode'] = args.report_mode
+    return config
+
+
+def timed(function, *args, **kwargs):
+    """
+    Returns:
+        tuple: (result, {'wall': seconds, 'cpu': seconds}) of one call.
+    """
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = function(*args, **kwargs)
+    return result, {'wall': time.perf_counter() - wall, 'cpu': time.process_time() - cpu}
+
+
+def run_stages(config, skip):
+    """
+    Runs the batch pipeline of main.py stage by stage.
+    Returns:
+        dict: stage name -> {'wall', 'cpu', 'items_in', 'items_out'}
+    """
+    results = {}
+    messages, results['read_and_sort_messages'] = timed(
+        read_and_sort_messages, config['message_dir'], config['initial_year'])
+    results['read_and_sort_messages'].update(items_in=len(config['files']), items_out=len(messages))
+
+    bank_messages, results['extract_messages'] = timed(extract_messages, messages, config['keywords'])
+    results['extract_messages'].update(items_in=len(messages), items_out=len(bank_messages))
+
+    transactions, results['extract_details'] = timed(extract_details, bank_messages)
+    results['extract_details'].update(items_in=len(bank_messages), items_out=len(transactions))
+
+    verified, results['verify_transactions'] = timed(
+        verify_transactions, transactions, threshold=config['threshold'])
+    flagged = sum(1 for transaction in verified if transaction['note'])
+    results['verify_transactions'].update(items_in=len(transactions), items_out=len(verified), flagged=flagged)
+
+    if 'generate_csv_files' not in skip:
+        _, results['generate_csv_files'] = timed(
+            generate_csv_files, verified, config['output_dir'], mode=config.get('report_mode', 'standard'))
+        results['generate_csv_files'].update(items_in=len(verified),
+                                             items_out=len(os.listdir(config['output_dir'])))
+
+    if 'charts' not in skip:
+        monthly_totals, results['calculate_monthly_totals'] = timed(calculate_monthly_totals, verified)
+        results['calculate_monthly_totals'].update(
+            items_in=len(verified), items_out=sum(map(len, monthly_totals.values())))
+        _, results['plot_monthly_totals'] = timed(
+            plot_monthly_totals, monthly_totals, config['output_dir'], dpi=config.get('chart_dpi', 300))
+        results['plot_monthly_totals'].update(items_in=len(monthly_totals))
+    return results
+
+
+def run_end_to_end(config, work_dir):
+    """
+    Runs main.py in work_dir against its own config.yaml.
+    Returns:
+        dict: {'wall', 'cpu'}, the cpu time being the child process's.
+    """
+    with open(os.path.join(work_dir, 'config.yaml'), 'w', encoding='utf-8') as file:
+        yaml.safe_dump({key: value for key, value in config.items() if key != 'files'}, file, allow_unicode=True)
+    before = os.times()
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, 'main.py')], cwd=work_dir, check=True)
+    wall = time.perf_counter() - start
+    after = os.times()
+    cpu = (after.children_user - before.children_user) + (after.children_system - before.children_system)
+    return {'wall': wall, 'cpu': cpu}
+
+
+def benchmark_size(size, args):
+    """
+    Generates a corpus of `size` messages split over args.files exports and times every stage on it.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        message_dir = os.path.join(work_dir, 'messages')
+        per_file = max(size // args.files, 1)
+        start = time.perf_counter()
+        generate_corpus(message_dir, args.files, per_file, seed=args.seed, n_accounts=args.accounts,
+                        missing_balance_rate=args.missing_balance_rate, discrepancy_rate=args.discrepancy_rate,
+                        noise_rate=args.noise_rate)
+        generated = time.perf_counter() - start
+
+        config = make_config(message_dir, os.path.join(work_dir, 'reports'), args)
+        config['files'] = sorted(os.listdir(message_dir))
+        os.makedirs(config['output_dir'])
+        results = run_stages(config, args.skip)
+        if 'end_to_end' not in args.skip:
+            for name in os.listdir(config['output_dir']):
+                os.remove(os.path.join(config['output_dir'], name))
+            results['end_to_end'] = run_end_to_end(config, work_dir)
+    return {'messages': per_file * args.files, 'files': args.files, 'generate_seconds': generated,
+            'stages': results}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(report, baseline=None):
+    """
+    Prints one line per size and stage; with a baseline report, adds the wall-time ratio new/old.
+    """
+    old = {}
+    if baseline:
+        old = {(run['messages'], stage): timing['wall']
+               for run in baseline['runs'] for stage, timing in run['stages'].items()}
+    header = f"{'messages':>10} {'stage':<24} {'wall s':>9} {'cpu s':>9} {'msg/s':>11}"
+    print(header + (f" {'vs ' + (baseline.get('revision') or 'baseline'):>14}" if baseline else ''))
+    for run in report['runs']:
+        for stage in STAGES:
+            timing = run['stages'].get(stage)
+            if timing is None:
+                continue
+            line = (f"{run['messages']:>10} {stage:<24} {timing['wall']:>9.3f} {timing['cpu']:>9.3f} "
+                    f"{run['messages'] / timing['wall'] if timing['wall'] else 0:>11.0f}")
+            if (run['messages'], stage) in old:
+                line += f" {timing['wall'] / old[(run['messages'], stage)]:>13.2f}x"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='total messages per corpus, up to 10^7')
+    parser.add_argument('--files', type=int, default=4, help='exports the messages are split over')
+    parser.add_argument('--accounts', type=int, default=4, help='accounts per export')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--missing-balance-rate', type=float, default=0.02)
+    parser.add_argument('--discrepancy-rate', type=float, default=0.01)
+    parser.add_argument('--noise-rate', type=float, default=0.05)
+    parser.add_argument('--report-mode', choices=['standard', 'fast'], help='override config.yaml')
+    parser.add_argument('--skip', nargs='*', default=[], choices=['generate_csv_files', 'charts', 'end_to_end'],
+                        help='stages to leave out, e.g. the reports on very large corpora')
+    parser.add_argument('--output', default='bench.json', help='where to write the JSON results')
+    parser.add_argument('--compare', help='an earlier results file to compare against')
+    args = parser.parse_args()
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'runs': [],
+    }
+    for size in args.sizes:
+        report['runs'].append(benchmark_size(size, args))
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+    print_results(report, baseline)
+    print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
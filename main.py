@@ -1,17 +1,105 @@
+import time
+STARTUP_BEGIN = time.perf_counter()
+
+import argparse
+import sys
 from config import read_config_file
-from utils.data_extraction import read_and_sort_messages, extract_messages, extract_details
-from utils.report_generation import generate_csv_files, calculate_monthly_totals, plot_monthly_totals
+from utils.data_extraction import read_and_sort_messages, extract_messages, extract_details, read_and_parse_messages
+from utils.charts import export_charts
 from utils.data_verification import verify_transactions
+from utils.scheduler import verify_and_export
+from utils.dedup import dedup_rules
+from utils.pipeline import run_streaming_pipeline, run_incremental_pipeline
+from utils.watch import run_watch
+from utils.metrics import start_memory_tracing, profiled, write_summary
+STARTUP_IMPORTED = time.perf_counter()
+
+HEAVY_MODULES = ['numpy', 'openpyxl', 'matplotlib', 'seaborn', 'pandas', 'pyarrow']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Analyze bank SMS transactions and generate per-account reports.')
+    parser.add_argument('--stream', action='store_true',
+                        help='run the constant-memory streaming pipeline (per-account spill, k-way merge)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes used to parse message files and to verify and export accounts (default: 1)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='drop the transaction cache and parse every message file again')
+    parser.add_argument('--verify-only', action='store_true',
+                        help='parse and verify the messages without writing any report')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print import and total time, and which heavy modules were loaded')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running and re-export the accounts touched by new or appended message files')
+    parser.add_argument('--interval', type=float, default=0.25,
+                        help='seconds between directory polls in watch mode (default: 0.25)')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='write a per-stage run summary to PATH (JSON, or Prometheus text for *.prom)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='record peak memory per stage with tracemalloc (slows the run down)')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='run under cProfile and dump the stats to PATH (python -m pstats PATH)')
+    return parser.parse_args()
+
+
+def report_startup(stage):
+    """
+    Prints the time since interpreter start-up of main.py and the heavy modules loaded so far.
+    """
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"[startup] {stage}: imports {(STARTUP_IMPORTED - STARTUP_BEGIN) * 1000:.1f} ms, "
+          f"elapsed {(time.perf_counter() - STARTUP_BEGIN) * 1000:.1f} ms, "
+          f"heavy modules loaded: {', '.join(loaded) or 'none'}")
+
+
+def read_transactions(config, workers=1):
+    """
+    Reads and parses the message directory for the batch and verify-only runs.
+    Returns:
+        list: The transactions in date order.
+    """
+    rules = dedup_rules(config)
+    errors = config.get('decode_errors', 'replace')
+    if workers > 1 or rules:
+        # Parsed per file, which deduplication needs to tell overlapping exports apart.
+        return read_and_parse_messages(config['message_dir'], config['initial_year'], config['keywords'],
+                                       workers=workers, errors=errors, dedup=rules)
+    sorted_messages = read_and_sort_messages(config['message_dir'], config['initial_year'], errors=errors)
+    bank_messages = extract_messages(sorted_messages, config['keywords'])
+    return extract_details(bank_messages)
+
 
 if __name__ == "__main__":
+    args = parse_args()
     config = read_config_file()
+    if args.profile_startup:
+        report_startup('config read')
 
-    sorted_messages = read_and_sort_messages(config['message_dir'], config['initial_year'])
-    bank_messages = extract_messages(sorted_messages, config['keywords'])
-    transactions = extract_details(bank_messages)
+    if args.trace_memory:
+        start_memory_tracing()
 
-    verified_transactions = verify_transactions(transactions, threshold=config['threshold'])
-    generate_csv_files(verified_transactions, config['output_dir'])
+    with profiled(args.profile):
+        if args.verify_only:
+            transactions = read_transactions(config, workers=args.workers)
+            if not transactions:
+                print("No transactions to verify.")
+            else:
+                verified_transactions = verify_transactions(transactions, threshold=config['threshold'])
+                flagged = sum(1 for transaction in verified_transactions if transaction['note'])
+                print(f"{len(verified_transactions)} transactions verified, {flagged} with notes")
+        elif args.watch:
+            run_watch(config, interval=args.interval)
+        elif args.stream:
+            run_streaming_pipeline(config)
+        elif config.get('cache', False):
+            run_incremental_pipeline(config, workers=args.workers, rebuild=args.rebuild)
+        else:
+            transactions = read_transactions(config, workers=args.workers)
+            verify_and_export(transactions, config, workers=args.workers)
+            export_charts(transactions, config, workers=args.workers)
 
-    # monthly_totals = calculate_monthly_totals(transactions)
-    # plot_monthly_totals(monthly_totals, config['output_dir'])
+    if args.metrics:
+        write_summary(args.metrics, wall_seconds=time.perf_counter() - STARTUP_BEGIN,
+                      import_seconds=STARTUP_IMPORTED - STARTUP_BEGIN, argv=sys.argv[1:])
+    if args.profile_startup:
+        report_startup('finished')
@@ -0,0 +1,53 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from config import read_config_file
+from utils.parsers import FIELDS
+from utils.query import index_path, query_transactions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Query the parsed transactions from the index written by the sqlite sink.',
+        epilog='example: python query.py --account 2222 --from 2019-01 --min-amount 500')
+    parser.add_argument('--account', help='account number')
+    parser.add_argument('--from', dest='date_from', metavar='PERIOD', help='first day, month or year (YYYY[-MM[-DD]])')
+    parser.add_argument('--to', dest='date_to', metavar='PERIOD', help='last day, month or year (YYYY[-MM[-DD]])')
+    parser.add_argument('--counterparty', help="exact object1/object2, or a glob pattern such as '*陈晓明*'")
+    parser.add_argument('--bank', help='bank name, e.g. 中国农业银行')
+    parser.add_argument('--type', dest='transaction_type', choices=['income', 'outcome'])
+    parser.add_argument('--min-amount', type=float, help='smallest absolute amount')
+    parser.add_argument('--max-amount', type=float, help='largest absolute amount')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--format', choices=['table', 'csv', 'json'], default='table')
+    parser.add_argument('--db', help='index database (default: transactions.sqlite3 in output_dir of config.yaml)')
+    return parser.parse_args()
+
+
+def print_results(transactions, output_format):
+    if output_format == 'json':
+        json.dump(transactions, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif output_format == 'csv':
+        writer = csv.DictWriter(sys.stdout, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(transactions)
+    else:
+        for transaction in transactions:
+            print('\t'.join('' if transaction[field] is None else str(transaction[field]) for field in FIELDS[:8]))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    path = args.db or index_path(read_config_file()['output_dir'])
+    filters = {key: value for key, value in vars(args).items() if key not in ('format', 'db')}
+    start = time.perf_counter()
+    try:
+        transactions = query_transactions(path, **filters)
+    except (FileNotFoundError, ValueError) as e:
+        sys.exit(str(e))
+    elapsed = time.perf_counter() - start
+    print_results(transactions, args.format)
+    print(f"{len(transactions)} transactions in {elapsed * 1000:.1f} ms", file=sys.stderr)
@@ -0,0 +1,172 @@
+# bulk_reader.py
+
+import codecs
+import io
+import mmap
+import os
+
+
+# Bytes decoded at a time; memory use is bounded by this, not by the file size.
+CHUNK_SIZE = 1 << 20
+# Bytes looked at to detect the encoding.
+SAMPLE_SIZE = 64 << 10
+# What to do with a line that does not decode: raise, decode it with U+FFFD, or drop it.
+ERROR_POLICIES = ('strict', 'replace', 'skip')
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+
+
+def detect_encoding(sample):
+    """
+    Guesses the encoding of an SMS export from its first bytes.
+    A byte order mark decides; UTF-16 without one shows up as NUL bytes in every other position
+    (digits, punctuation and newlines are ASCII). Otherwise the lines containing non-ASCII bytes are
+    tried as UTF-8 and then GB18030: a few undecodable lines keep UTF-8 (they are reported as bad
+    lines), mostly undecodable ones that GB18030 accepts switch to GB18030.
+    Args:
+        sample (bytes): The beginning of the file.
+    Returns:
+        tuple: (codec name, length of the byte order mark to skip)
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, len(bom)
+
+    half = len(sample) // 2
+    if half:
+        even_nuls, odd_nuls = sample[0::2].count(0), sample[1::2].count(0)
+        if odd_nuls > half // 4 and even_nuls < odd_nuls // 8:
+            return 'utf-16-le', 0
+        if even_nuls > half // 4 and odd_nuls < even_nuls // 8:
+            return 'utf-16-be', 0
+
+    # The sample may end inside a line (and a character), leave that line out.
+    lines = [line for line in sample.split(b'\n')[:-1] if not line.isascii()] or [sample]
+    utf8_failures = sum(1 for line in lines if not decodes(line, 'utf-8'))
+    if utf8_failures * 2 > len(lines):
+        gb18030_failures = sum(1 for line in lines if not decodes(line, 'gb18030'))
+        if gb18030_failures < utf8_failures:
+            return 'gb18030', 0
+    return 'utf-8', 0
+
+
+def decodes(data, encoding):
+    try:
+        codecs.decode(data, encoding)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def newline_bytes(encoding):
+    """
+    Returns:
+        tuple: (the encoded newline, the code unit size lines are aligned to)
+    """
+    if encoding.startswith('utf-16'):
+        return '\n'.encode(encoding), 2
+    # Every trail byte of UTF-8 and GB18030 is above 0x2F, so b'\n' never occurs inside a character.
+    return b'\n', 1
+
+
+def find_line_end(buffer, encoding, start, end):
+    """
+    Finds the end (exclusive) of the last complete line in buffer[start:end].
+    Returns:
+        int: The offset just past the last newline, or start if there is none.
+    """
+    newline, unit = newline_bytes(encoding)
+    position = buffer.rfind(newline, start, end)
+    while position >= start and (position - start) % unit:
+        position = buffer.rfind(newline, start, position + len(newline) - 1)
+    return position + len(newline) if position >= start else start
+
+
+def iter_buffer_lines(buffer, encoding, errors='replace', bad_lines=None, start=0, end=None):
+    """
+    Decodes buffer[start:end] chunk by chunk and yields its lines like a file opened in text mode
+    (universal newlines, '\\n' kept). Chunks are decoded straight from a memoryview, without copying
+    the bytes; a chunk that fails to decode is redone line by line so only its bad lines are affected.
+    Args:
+        buffer (bytes-like): The raw data, e.g. an mmap.
+        encoding (str): The codec, see detect_encoding.
+        errors (str): One of ERROR_POLICIES.
+        bad_lines (list, optional): Receives (byte offset, reason) for every line that did not decode.
+        start (int): The offset to start at, a line start (e.g. past the byte order mark).
+        end (int, optional): The offset to stop at; defaults to the end of the buffer.
+    Yields:
+        str: The decoded lines.
+    Raises:
+        ValueError: If errors is not a known policy.
+        UnicodeDecodeError: For a bad line under the 'strict' policy.
+    """
+    if errors not in ERROR_POLICIES:
+        raise ValueError(f"Unknown decode error policy: {errors}, choose from {ERROR_POLICIES}")
+    end = len(buffer) if end is None else end
+    with memoryview(buffer) as view:
+        position = start
+        while position < end:
+            limit = min(position + CHUNK_SIZE, end)
+            cut = find_line_end(buffer, encoding, position, limit) if limit < end else end
+            if cut == position:
+                # A single line longer than the chunk size.
+                cut = find_line_end(buffer, encoding, position, end)
+                cut = end if cut == position else cut
+            with view[position:cut] as chunk:
+                try:
+                    text = str(chunk, encoding)
+                except UnicodeDecodeError:
+                    text = None
+            if text is not None:
+                yield from io.StringIO(text, newline=None)
+            else:
+                yield from iter_lines_checked(buffer, view, encoding, errors, bad_lines, position, cut)
+            position = cut
+
+
+def iter_lines_checked(buffer, view, encoding, errors, bad_lines, start, end):
+    """
+    Line-by-line fallback of iter_buffer_lines for a chunk that contains undecodable bytes.
+    """
+    newline, unit = newline_bytes(encoding)
+    line_start = start
+    while line_start < end:
+        position = buffer.find(newline, line_start, end)
+        while position >= 0 and (position - line_start) % unit:
+            position = buffer.find(newline, position + 1, end)
+        line_end = end if position < 0 else position + len(newline)
+        with view[line_start:line_end] as line:
+            try:
+                text = str(line, encoding)
+            except UnicodeDecodeError as e:
+                if bad_lines is not None:
+                    bad_lines.append((line_start, e.reason))
+                if errors == 'strict':
+                    raise
+                text = str(line, encoding, 'replace') if errors == 'replace' else None
+        if text is not None:
+            yield from io.StringIO(text, newline=None)
+        line_start = line_end
+
+
+def iter_file_lines(file_path, errors='replace', bad_lines=None):
+    """
+    Reads a message file through mmap, detecting UTF-8, GB18030 and UTF-16 exports, and yields its
+    lines as text. Memory use does not grow with the file size.
+    Args:
+        file_path (str): The path of the message file.
+        errors (str): One of ERROR_POLICIES, applied per line.
+        bad_lines (list, optional): Receives (byte offset, reason) for every undecodable line.
+    Yields:
+        str: The decoded lines, '\\n'-terminated as in text mode.
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            encoding, bom_length = detect_encoding(buffer[:SAMPLE_SIZE])
+            yield from iter_buffer_lines(buffer, encoding, errors, bad_lines, start=bom_length)
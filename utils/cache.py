@@ -0,0 +1,114 @@
+# cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+from utils.util import setup_logger
+from utils.dedup import dedup_rules
+
+
+logger = setup_logger()
+
+# Bump whenever the parsers or the transaction layout change, so stale entries are dropped.
+CACHE_VERSION = 4
+CACHE_FILE = os.path.join('.cache', 'transactions.sqlite3')
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 of a file's content.
+    Args:
+        file_path (str): The file to hash.
+        chunk_size (int): The number of bytes read at a time.
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_fingerprint(config):
+    """
+    Identifies everything besides a file's content that changes its parsed transactions
+    (or the reports built from them).
+    Args:
+        config (dict): The configuration parameters read from config.yaml.
+    Returns:
+        str: The fingerprint stored alongside the cache entries.
+    """
+    return json.dumps({
+        'version': CACHE_VERSION,
+        'initial_year': config['initial_year'],
+        'keywords': list(config['keywords']),
+        'decode_errors': config.get('decode_errors', 'replace'),
+        'threshold': config['threshold'],
+        'dedup': dedup_rules(config),
+    }, ensure_ascii=False, sort_keys=True)
+
+
+class TransactionCache:
+    """
+    Persistent per-file cache of parsed transactions, stored in SQLite under output_dir/.cache.
+    Every entry keeps the file's content hash, its parsed transactions and its year-inference end state.
+    """
+
+    def __init__(self, output_dir, config, rebuild=False):
+        path = os.path.join(output_dir, CACHE_FILE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'name TEXT PRIMARY KEY, digest TEXT NOT NULL, state TEXT NOT NULL, transactions TEXT NOT NULL)'
+        )
+        fingerprint = cache_fingerprint(config)
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if rebuild or row is None or row[0] != fingerprint:
+            if row is not None:
+                logger.info('Transaction cache invalidated, rebuilding')
+            self.connection.execute('DELETE FROM files')
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+            self.connection.commit()
+
+    def digests(self):
+        """
+        Returns:
+            dict: file name -> content hash for every cached file.
+        """
+        return dict(self.connection.execute('SELECT name, digest FROM files'))
+
+    def load(self, name):
+        """
+        Loads one file's cached entry.
+        Returns:
+            tuple: (transactions, year-inference state), or None if the file is not cached.
+        """
+        row = self.connection.execute('SELECT transactions, state FROM files WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def store(self, name, digest, transactions, state):
+        """
+        Stores (or replaces) one file's entry. Call commit() to persist it.
+        """
+        self.connection.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+            (name, digest, json.dumps(state), json.dumps(transactions, ensure_ascii=False)),
+        )
+
+    def remove(self, name):
+        """
+        Forgets a file that no longer exists. Call commit() to persist it.
+        """
+        self.connection.execute('DELETE FROM files WHERE name = ?', (name,))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,184 @@
+# charts.py
+
+import importlib.util
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from utils.util import log_execution, setup_logger
+
+
+logger = setup_logger()
+
+# Bars above which the value labels are left out: they overlap anyway and text layout
+# dominates the rendering time of long histories.
+ANNOTATE_LIMIT = 48
+# Month labels shown on the x axis at most; longer histories label every n-th month.
+MAX_TICK_LABELS = 8
+
+
+@log_execution(verbose=False)
+def calculate_monthly_totals(transactions):
+    """
+    Calculates the monthly income and outcome totals of every account in one NumPy group-by:
+    each transaction gets an account x month code and np.bincount sums the amounts per code.
+    Args:
+        transactions (list): The transaction details.
+    Returns:
+        dict: account number -> {'YYYY-MM': {'income': float, 'outcome': float}}, for the months
+            the account has transactions in.
+    """
+    import numpy as np
+
+    accounts = {}
+    account_codes = np.fromiter((accounts.setdefault(transaction['account_number'], len(accounts))
+                                 for transaction in transactions), dtype=np.int64, count=len(transactions))
+    dates = np.fromiter((transaction['date'] for transaction in transactions),
+                        dtype=np.int64, count=len(transactions))
+    amounts = np.fromiter((float(transaction['amount']) for transaction in transactions),
+                          dtype=np.float64, count=len(transactions))
+
+    # Months counted from the first one, so the codes need no sort: yyyymmdd // 100 is yyyymm.
+    month_codes = dates // 10000 * 12 + dates // 100 % 100 - 1
+    first_month = int(month_codes.min()) if len(month_codes) else 0
+    month_codes -= first_month
+    n_months = int(month_codes.max()) + 1 if len(month_codes) else 0
+    codes = account_codes * n_months + month_codes
+    size = len(accounts) * n_months
+    income = np.bincount(codes, weights=np.where(amounts > 0, amounts, 0.0), minlength=size)
+    outcome = np.bincount(codes, weights=np.where(amounts > 0, 0.0, -amounts), minlength=size)
+    present = np.bincount(codes, minlength=size) > 0
+
+    month_names = [f'{month // 12:04d}-{month % 12 + 1:02d}' for month in range(first_month, first_month + n_months)]
+    monthly_totals = {}
+    for account_number, account_code in accounts.items():
+        row = slice(account_code * n_months, (account_code + 1) * n_months)
+        monthly_totals[account_number] = {
+            month_names[i]: {'income': income_total, 'outcome': outcome_total}
+            for i, (income_total, outcome_total, has_transactions) in enumerate(
+                zip(income[row].tolist(), outcome[row].tolist(), present[row].tolist()))
+            if has_transactions
+        }
+    return monthly_totals
+
+
+@lru_cache(maxsize=None)
+def chart_figure():
+    """
+    Imports matplotlib (headless backend) and seaborn and creates the one figure a process draws
+    every chart on; creating and tearing down a figure per account costs more than drawing it.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Setting Seaborn style
+    sns.set(style="whitegrid")
+    return plt.subplots()
+
+
+def render_account_charts(accounts, output_dir, dpi=300, annotate_limit=ANNOTATE_LIMIT):
+    """
+    Renders the side-by-side income/outcome bar chart of a batch of accounts to <account>.png,
+    reusing one figure for the whole batch.
+    Args:
+        accounts (list): (account number, {'YYYY-MM': {'income', 'outcome'}}) pairs.
+        output_dir (str): The directory where the charts will be saved.
+        dpi (int): The resolution of the PNG files.
+        annotate_limit (int): Bars above which the value labels are skipped.
+    """
+    import numpy as np
+
+    fig, ax = chart_figure()
+    for account, months in accounts:
+        ax.clear()
+        months_sorted = sorted(months.keys())
+        incomes = [months[month]['income'] for month in months_sorted]
+        outcomes = [months[month]['outcome'] for month in months_sorted]
+
+        bar_width = 0.35
+        index = np.arange(len(months_sorted))
+        # Dense charts drop the white bar edges, which would otherwise cover the thin bars.
+        dense = 2 * len(months_sorted) > annotate_limit
+        edge = {'linewidth': 0} if dense else {}
+
+        bar1 = ax.bar(index, incomes, bar_width, label='Income', color='skyblue', **edge)
+        bar2 = ax.bar(index + bar_width, outcomes, bar_width, label='Outcome', color='salmon', **edge)
+
+        ax.set_xlabel('Month', fontsize=10, fontweight='bold')
+        ax.set_ylabel('Amount', fontsize=12, fontweight='bold')
+        ax.set_title(f'Monthly Income and Outcome Comparison for Account {account}', fontsize=14, fontweight='bold')
+
+        step = -(-len(months_sorted) // MAX_TICK_LABELS)
+        ax.set_xticks(index[::step] + bar_width / 2)
+        ax.set_xticklabels(months_sorted[::step], rotation=0, fontsize=10, ha='center')
+
+        # Add padding to X- and Y-axes
+        ax.set_ylim(0, max(incomes + outcomes) * 1.1 or 1)  # 10% padding above the max value
+        ax.margins(x=0.1)  # 5% padding for the x-axis
+
+        ax.legend()
+
+        # Adding grid lines
+        ax.yaxis.grid(True)
+
+        if not dense:
+            for bars in (bar1, bar2):
+                ax.bar_label(bars, labels=[f'{round(bar.get_height(), 2)}' for bar in bars],
+                             padding=3, fontsize=9)
+
+        fig.tight_layout()
+        try:
+            fig.savefig(os.path.join(output_dir, f'{account}.png'), dpi=dpi)
+        except IOError as e:
+            logger.error(f"IO error occurred while writing the chart of account {account}: {e}")
+
+
+@log_execution(verbose=False)
+def plot_monthly_totals(monthly_totals, output_dir, workers=1, dpi=300):
+    """
+    Plots every account's monthly totals as side-by-side bar charts.
+    With several workers the accounts are split into one batch per process, so each process
+    sets up matplotlib and its figure once.
+    Args:
+        monthly_totals (dict): As returned by calculate_monthly_totals.
+        output_dir (str): The directory where the charts will be saved.
+        workers (int): The number of processes rendering charts.
+        dpi (int): The resolution of the PNG files.
+    """
+    # Largest accounts first, dealt round-robin, so the batches take about the same time.
+    accounts = sorted(monthly_totals.items(), key=lambda item: len(item[1]), reverse=True)
+    accounts = [item for item in accounts if item[1]]
+    workers = min(workers, len(accounts))
+    if workers <= 1:
+        render_account_charts(accounts, output_dir, dpi)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(render_account_charts, [accounts[i::workers] for i in range(workers)],
+                      repeat(output_dir), repeat(dpi)))
+
+
+def charts_enabled(config):
+    """
+    Charts are drawn only when 'charts' is set to true in config.yaml: at about half a second per
+    account they cost more than the rest of the pipeline. They need matplotlib and seaborn; without
+    them an error is logged and charting is skipped.
+    """
+    if not config.get('charts', False):
+        return False
+    # Only looked up, the parent process does not need to import them when workers draw the charts.
+    if importlib.util.find_spec('matplotlib') is None or importlib.util.find_spec('seaborn') is None:
+        logger.error("Charts need matplotlib and seaborn (pip install matplotlib seaborn), skipping them")
+        return False
+    return True
+
+
+def export_charts(transactions, config, workers=1):
+    """
+    Writes the monthly income/outcome chart of every account to output_dir, see charts_enabled.
+    """
+    if not transactions or not charts_enabled(config):
+        return
+    plot_monthly_totals(calculate_monthly_totals(transactions), config['output_dir'], workers=workers,
+                        dpi=config.get('chart_dpi', 300))
@@ -1,140 +1,422 @@
 # data_extraction.py
 
+import heapq
 import os
+from bisect import bisect_right
 import re
-from utils.util import log_execution, parse_date, setup_logger
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from operator import itemgetter
+from utils.util import log_execution, parse_date_key, setup_logger
+from utils.parsers import (DATE_RE, TYPE_KEYWORDS, parse_message, get_parser_stats, merge_parser_stats,
+                           reset_parser_stats)
+from utils.keyword_matcher import get_matcher
+from utils.bulk_reader import iter_file_lines
+from utils.dedup import deduplicate_transactions
+from utils.metrics import stage, get_stage_metrics, merge_stage_metrics, reset_metrics
 
 
 logger = setup_logger()
+STD_YEAR_RE = re.compile(r'(\d{4})-')
+# The month of a message; the optional day makes the same search yield the whole date ('01月22日').
+MONTH_RE = re.compile(r'(\d+)月(\d+日)?')
+
+
+def keyword_prefilter(keywords):
+    """
+    Builds the single-pass prefilter for extract_messages: one matcher over the configured keywords
+    plus the transaction-type keywords, so the matched set can be reused by classify_transaction.
+    Args:
+        keywords (list): The list of keywords a message must contain to be kept.
+    Returns:
+        function: message -> the frozenset of matched keywords, or None if the message is not relevant.
+    """
+    matcher = get_matcher(tuple(keywords) + TYPE_KEYWORDS)
+    relevant = frozenset(keywords)
+
+    def prefilter(message):
+        matched = matcher.scan(message)
+        return None if matched.isdisjoint(relevant) else matched
+    return prefilter
+
+
+def list_message_files(message_dir):
+    """
+    Lists the .txt message files in a directory, in directory order.
+    Args:
+        message_dir (str): The directory where message files are stored.
+    Returns:
+        list: The file names ending with '.txt'.
+    """
+    return [file for file in os.listdir(message_dir) if file.endswith('.txt')]
+
+
+def iter_year_messages(lines, initial_year, state=None, keys=None, source=None):
+    """
+    Infers the year of every message in a sequence of lines from one message file.
+    Args:
+        lines (iterable): The file's lines, in file order.
+        initial_year (int): The initial year to use for parsing dates in messages.
+        state (dict, optional): Year-inference state ('current_year', 'last_month', 'std_year').
+            Missing keys start from the defaults; the end state is written back once the stream ends,
+            so the next lines of the same file can continue from it.
+        keys (list, optional): Receives the yyyymmdd date key of every yielded message. The month
+            search already finds the date, so this saves sort_file_messages a second regex scan of
+            every message.
+        source (str, optional): Named in the log when messages are skipped.
+    Yields:
+        tuple: (message, year) for every line that carries a valid date. A line whose month has no
+            day ('12月账单已出') or whose date does not exist ('02月30日') still counts for the year
+            inference, but is logged and skipped.
+    """
+    state = {} if state is None else state
+    current_year = state.get('current_year', initial_year)
+    last_month = state.get('last_month', 0)
+    std_year = state.get('std_year', 2000)
+    undated = []
+    try:
+        for message in lines:
+            # NOTE: 前面会读到一个标准年份，作为年份校准，如果和后面同时都++的时候再添加
+            std_year_match = STD_YEAR_RE.search(message)
+            if std_year_match:
+                std_year = int(std_year_match.group(1))
+            month_match = MONTH_RE.search(message)
+            if month_match:
+                month = int(month_match.group(1))
+                if month < last_month:
+                    current_year += 1
+                    if current_year > std_year:
+                        current_year = std_year
+                last_month = month
+                try:
+                    date = month_match.group() if month_match.lastindex == 2 else DATE_RE.search(message).group()
+                    key = parse_date_key(date, current_year)
+                except (AttributeError, ValueError):
+                    undated.append(message)
+                    continue
+                if keys is not None:
+                    keys.append(key)
+                yield message, current_year
+    finally:
+        state.update(current_year=current_year, last_month=last_month, std_year=std_year)
+        if undated:
+            logger.warning(f"{source or 'Message file'}: {len(undated)} messages without a valid date skipped, "
+                           f"first: {undated[0].strip()[:80]!r}")
+
+
+def iter_file_messages(file_path, initial_year, state=None, errors='replace', keys=None):
+    """
+    Lazily reads one message file line by line and infers the year of every message.
+    The file is memory-mapped and its encoding detected (UTF-8, GB18030 or UTF-16, see
+    utils.bulk_reader); lines that do not decode are handled per the error policy and logged with
+    their byte offsets. Other errors are logged and end the stream; messages yielded before are kept.
+    Args:
+        file_path (str): The path of the message file.
+        initial_year (int): The initial year to use for parsing dates in messages.
+        state (dict, optional): Year-inference state, see iter_year_messages.
+        errors (str): 'replace' (default) decodes bad lines with U+FFFD, 'skip' drops them and
+            'strict' ends the file at the first one.
+        keys (list, optional): Receives the message date keys, see iter_year_messages.
+    Yields:
+        tuple: (message, year) for every line that carries a month.
+    """
+    bad_lines = []
+    try:
+        yield from iter_year_messages(iter_file_lines(file_path, errors, bad_lines), initial_year, state, keys,
+                                      os.path.basename(file_path))
+    except FileNotFoundError:
+        logger.error(f"File not found: {file_path}")
+    except Exception as e:
+        logger.error(f"An error occurred while processing {os.path.basename(file_path)}: {e}")
+    finally:
+        if bad_lines:
+            offsets = ', '.join(str(offset) for offset, _ in bad_lines[:20])
+            logger.warning(f"{os.path.basename(file_path)}: {len(bad_lines)} undecodable lines ({errors}) "
+                           f"at byte offsets {offsets}{' ...' if len(bad_lines) > 20 else ''}")
+
+
+def message_sort_key(message):
+    """
+    Sort key for a (message, year) tuple: the yyyymmdd key of the message date (memoised per day).
+    """
+    return parse_date_key(DATE_RE.search(message[0]).group(), message[1])
+
+
+def sort_file_messages(messages, file_name=None, keys=None):
+    """
+    Puts one file's (message, year) tuples in date order. Every key is computed once; an export that
+    is already chronological is returned as is, otherwise the out-of-order messages are repaired by a
+    stable sort on the integer keys, which runs in close to linear time on a few misplaced runs.
+    Args:
+        messages (list): The file's messages, as read.
+        file_name (str, optional): Named in the log when messages had to be moved.
+        keys (list, optional): The date keys collected by iter_year_messages, one per message.
+    Returns:
+        tuple: (date keys, messages), both in date order; same-day messages keep their file order.
+    """
+    if keys is None:
+        keys = [message_sort_key(message) for message in messages]
+    descents = sum(1 for previous, key in zip(keys, islice(keys, 1, None)) if key < previous)
+    if descents:
+        keys_read = keys
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        keys = [keys[i] for i in order]
+        messages = [messages[i] for i in order]
+        logger.info(f"{file_name or 'Message file'}: {count_moved(keys_read)} out-of-order messages repaired")
+    return keys, messages
+
+
+def count_moved(keys):
+    """
+    The fewest messages that have to move to put the keys in order: all but the longest
+    non-decreasing subsequence, so a block of 20 misplaced lines counts as 20.
+    """
+    tails = []
+    for key in keys:
+        i = bisect_right(tails, key)
+        if i == len(tails):
+            tails.append(key)
+        else:
+            tails[i] = key
+    return len(keys) - len(tails)
+
+
+def merge_file_messages(sorted_files):
+    """
+    Merges per-file results of sort_file_messages on their precomputed integer keys. The files are
+    concatenated and stably sorted: the sort finds the k sorted runs and merges them in C, O(n log k)
+    like heapq.merge but without a Python-level heap step per message. Same-day messages come in
+    file order, then in their order in the file.
+    Args:
+        sorted_files (iterable): (date keys, messages) per file, in directory order.
+    Returns:
+        list: All messages in date order.
+    """
+    keys, messages = [], []
+    for file_keys, file_messages in sorted_files:
+        keys.extend(file_keys)
+        messages.extend(file_messages)
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    return [messages[i] for i in order]
 
 
 @log_execution(verbose=False)
-def read_and_sort_messages(message_dir, initial_year):
+def read_and_sort_messages(message_dir, initial_year, errors='replace'):
     """
     Reads messages from .txt files in a specified directory, sorts them by date, and returns a list of messages.
+    Every file is put in order on its own (see sort_file_messages) and the files are merged, so the
+    result matches a stable sort of all files concatenated in directory order.
     Args:
         message_dir (str): The directory where message files are stored.
         initial_year (int): The initial year to use for parsing dates in messages.
+        errors (str): The decode error policy, see iter_file_messages.
     Returns:
         list: A list of sorted messages with their associated year.
     """
-    message_files = [
-        file for file in os.listdir(message_dir) if file.endswith('.txt')
+    sorted_files = []
+    for file_name in list_message_files(message_dir):
+        keys = []
+        messages = list(iter_file_messages(os.path.join(message_dir, file_name), initial_year,
+                                           errors=errors, keys=keys))
+        sorted_files.append(sort_file_messages(messages, file_name, keys))
+    return merge_file_messages(sorted_files)
+
+
+def iter_sorted_messages(message_dir, initial_year, errors='replace'):
+    """
+    Streaming counterpart of read_and_sort_messages: k-way merges the per-file streams by date.
+    Export files are already (mostly) chronological, so only one line per file is held at a time;
+    the exact per-account order is restored downstream.
+    Args:
+        message_dir (str): The directory where message files are stored.
+        initial_year (int): The initial year to use for parsing dates in messages.
+        errors (str): The decode error policy, see iter_file_messages.
+    Returns:
+        iterator: (message, year) tuples in merged date order.
+    """
+    streams = [
+        iter_file_messages(os.path.join(message_dir, file_name), initial_year, errors=errors)
+        for file_name in list_message_files(message_dir)
     ]
-    all_messages = []
-    
-    for file_name in message_files:
-        current_year = initial_year
-        last_month = 0
-        std_year = 2000
-        file_path = os.path.join(message_dir, file_name)
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                messages = file.readlines()
-                for message in messages:
-                    # NOTE: 前面会读到一个标准年份，作为年份校准，如果和后面同时都++的时候再添加
-                    std_year_match = re.search(r'(\d{4})-', message)
-                    if std_year_match:
-                        std_year = int(std_year_match.group(1))
-                    month_match = re.search(r'(\d+)月', message)
-                    if month_match:
-                        month = int(month_match.group(1))
-                        if month < last_month:
-                            current_year += 1
-                            if current_year > std_year:
-                                current_year = std_year
-                        last_month = month
-                        all_messages.append((message, current_year))
-        except FileNotFoundError:
-            logger.error(f"File not found: {file_path}")
-        except Exception as e:
-            logger.error(f"An error occurred while processing {file_name}: {e}")
-    return sorted(all_messages, key=lambda msg: parse_date(re.search(r'\d+月\d+日', msg[0]).group(), msg[1]))
+    return heapq.merge(*streams, key=message_sort_key)
+
+
+def iter_tagged_transactions(message_dir, initial_year, keywords, errors='replace'):
+    """
+    Streaming counterpart of read_and_parse_messages that keeps track of the source file, for
+    deduplication: every file is filtered and parsed lazily on its own and the transaction streams
+    are k-way merged by date.
+    Args:
+        message_dir (str): The directory where message files are stored.
+        initial_year (int): The initial year to use for parsing dates in messages.
+        keywords (list): The list of keywords a message must contain to be kept.
+        errors (str): The decode error policy, see iter_file_messages.
+    Returns:
+        iterator: (file name, transaction) pairs in merged date order.
+    """
+    streams = [
+        zip(repeat(file_name), iter_extract_details(iter_extract_messages(
+            iter_file_messages(os.path.join(message_dir, file_name), initial_year, errors=errors), keywords)))
+        for file_name in list_message_files(message_dir)
+    ]
+    return heapq.merge(*streams, key=lambda item: item[1]['date'])
+
+
+def parse_message_file(file_path, initial_year, keywords, errors='replace'):
+    """
+    Reads, sorts, filters and parses a single message file. Year inference only depends on the
+    file itself, so this runs independently per file (and per worker process).
+    Args:
+        file_path (str): The path of the message file.
+        initial_year (int): The initial year to use for parsing dates in messages.
+        keywords (list): The list of keywords a message must contain to be kept.
+        errors (str): The decode error policy, see iter_file_messages.
+    Returns:
+        tuple: (transactions sorted by date, parser hit/miss counters for this file,
+            stage metrics for this file, year-inference end state of the file)
+    """
+    reset_parser_stats()
+    reset_metrics()
+    with stage('parse_message_file') as record:
+        state, keys = {}, []
+        messages = list(iter_file_messages(file_path, initial_year, state, errors, keys))
+        _, messages = sort_file_messages(messages, os.path.basename(file_path), keys)
+        transactions = list(iter_extract_details(iter_extract_messages(messages, keywords)))
+        record['items_in'], record['items_out'] = len(messages), len(transactions)
+    return transactions, get_parser_stats(), get_stage_metrics(), state
+
+
+@log_execution(verbose=False)
+def parse_message_files(file_paths, initial_year, keywords, workers=1, errors='replace'):
+    """
+    Runs parse_message_file over several files, in a process pool when workers > 1.
+    The parser hit/miss counters and stage metrics of every file are added to this process's totals.
+    Args:
+        file_paths (list): The paths of the message files.
+        initial_year (int): The initial year to use for parsing dates in messages.
+        keywords (list): The list of keywords a message must contain to be kept.
+        workers (int): The number of worker processes; 1 parses in-process.
+        errors (str): The decode error policy, see iter_file_messages.
+    Returns:
+        list: (transactions, year-inference end state) per file, in the order of file_paths.
+    """
+    # parse_message_file resets the counters, keep the totals gathered so far.
+    parser_stats_before = get_parser_stats()
+    stage_metrics_before = get_stage_metrics()
+    if workers > 1 and len(file_paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(file_paths))) as pool:
+            results = list(pool.map(parse_message_file, file_paths, repeat(initial_year), repeat(keywords),
+                                    repeat(errors)))
+    else:
+        results = [parse_message_file(file_path, initial_year, keywords, errors) for file_path in file_paths]
+
+    reset_parser_stats()
+    merge_parser_stats(parser_stats_before)
+    reset_metrics()
+    merge_stage_metrics(stage_metrics_before)
+    for _, file_stats, file_metrics, _ in results:
+        merge_parser_stats(file_stats)
+        merge_stage_metrics(file_metrics)
+    return [(transactions, state) for transactions, _, _, state in results]
+
+
+@log_execution(verbose=False)
+def read_and_parse_messages(message_dir, initial_year, keywords, workers=1, errors='replace', dedup=None):
+    """
+    Reads and parses every message file, optionally in a process pool, and merges the per-file results.
+    The per-file lists are stably sorted and merged in directory order, so the result is identical to
+    extract_details(extract_messages(read_and_sort_messages(...))).
+    Args:
+        message_dir (str): The directory where message files are stored.
+        initial_year (int): The initial year to use for parsing dates in messages.
+        keywords (list): The list of keywords a message must contain to be kept.
+        workers (int): The number of worker processes; 1 parses in-process.
+        errors (str): The decode error policy, see iter_file_messages.
+        dedup (dict, optional): Deduplication rules (see utils.dedup); copies of the same SMS from
+            overlapping exports are then dropped while merging.
+    Returns:
+        list: A list of dictionaries, each containing the details of a transaction, in date order.
+    """
+    file_names = list_message_files(message_dir)
+    file_paths = [os.path.join(message_dir, file_name) for file_name in file_names]
+    results = parse_message_files(file_paths, initial_year, keywords, workers, errors)
+    if dedup:
+        return deduplicate_transactions([transactions for transactions, _ in results], file_names, dedup)
+    return merge_transactions(transactions for transactions, _ in results)
+
+
+def merge_transactions(per_file_transactions):
+    """
+    Merges per-file transaction lists that are each sorted by date, keeping ties in file order.
+    Args:
+        per_file_transactions (iterable): One date-sorted list of transactions per file.
+    Returns:
+        list: All transactions in date order.
+    """
+    return list(heapq.merge(*per_file_transactions, key=itemgetter('date')))
 
 
 @log_execution(verbose=False)
 def extract_messages(messages, keywords):
     """
     Extracts messages that contain any of the specified keywords.
+    Every message is scanned once by the keyword prefilter, and the keywords it found are kept
+    alongside the message so extract_details does not scan it again.
     Args:
         messages (list): The list of messages to search through.
         keywords (list): The list of keywords to search for in messages.
     Returns:
-        list: A list of messages that contain any of the keywords.
+        list: (message, year, matched keywords) for the messages that contain any of the keywords.
     """
-    return [message for message in messages if any(keyword in message[0] for keyword in keywords)]
+    return list(iter_extract_messages(messages, keywords))
+
+
+def iter_extract_messages(messages, keywords):
+    """
+    Streaming counterpart of extract_messages.
+    Args:
+        messages (iterable): (message, year) tuples to search through.
+        keywords (list): The list of keywords to search for in messages.
+    Yields:
+        tuple: (message, year, matched keywords) for the messages that contain any of the keywords.
+    """
+    prefilter = keyword_prefilter(keywords)
+    for message, year in messages:
+        matched = prefilter(message)
+        if matched is not None:
+            yield message, year, matched
 
 
 @log_execution(verbose=False)
 def extract_details(messages):
     """
     Extracts detailed information from messages, including date, account number, transaction type, amount, balance, and bank name.
+    Each message is routed by its bank tag to the precompiled parser registry in utils.parsers,
+    falling back to the generic regex cascade for formats without a fast path.
     Args:
-        messages (list): The list of messages to extract details from.
+        messages (list): (message, year) or (message, year, matched keywords) tuples, as returned
+            by extract_messages.
     Returns:
         list: A list of dictionaries, each containing the details of a transaction.
     """
-    details = []
-    for message, year in messages:
-        # Extracting date
-        date = parse_date(re.search(r'\d+月\d+日', message).group(), year)
-
-        # Extracting account number
-        account_number_match = re.search(r'(\d+账户|账户\d+|\d+公司账户|\d+个人账户)', message)
-        if not account_number_match:
-            account_number_match = re.search(r'尾号(\d+)', message)
-        # Extracting the digits from the match
-        if account_number_match:
-            # Removing "账户" to get only the account number
-            account_number = re.search(r'\d+', account_number_match.group(0)).group(0)
-        else:
-            account_number = ' '
-
-        # Extracting objects using regular expressions
-        object1_match = re.search(r'(.+?)于', message)
-        object2_match = re.search(r'向(.+?)完成', message)
-        object1 = object1_match.group(1) if object1_match else f"您尾号{account_number}账户"
-        object2 = object2_match.group(1) if object2_match else ' '
-        try:
-            amount = re.search(r'(?:收入|支出|人民币|金额为)((?:-)?\d+\.\d{2})(?:元|人民币)?', message).group(1)
-        except AttributeError:
-            try:
-                amount = re.search(r'金额为((?:-)?\d+\.\d{2})', message).group(1)
-            except AttributeError:
-                amount = re.search(r'(收入|支出)((?:-)?\d+\.\d{2})(人民币|元)', message).group(2)
-
-        try:
-            balance = re.search(r'余额(\d+\.\d{2})', message).group(1)
-        except AttributeError:
-            balance = '0.00'
-
-        # Extracting transaction type, amount and balance
-        if '收入' in message or '转存' in message or '结息' in message:
-            transaction_type = 'income'
-            amount_sign = '+'
-        elif '支出' in message or '支付支取' in message or '转支' in message or '通知存款交易' in message or '-' in amount:
-            transaction_type = 'outcome'
-            amount_sign = '-'
-        else:
-            transaction_type = 'income'
-            amount_sign = ''
-        # Extracting bank name, ensuring it ends with '银行'
-        bank_name_match = re.search(r'【(.*?)】|\[(.*?银行)\]', message)
-        bank_name = bank_name_match.group(1) or bank_name_match.group(2) if bank_name_match else 'Unknown'
-        amount = f"{amount_sign}{amount}" if (amount != 'Unknown' and '-' not in amount) else amount
-
-        details.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'object1': object1,
-            'object2': object2,
-            'account_number': account_number,
-            'type': transaction_type,
-            'amount': amount,
-            'balance': balance,
-            'bank_name': bank_name,
-            'note': '',
-            'gap': '',
-            'running_balance': "",
-        })
+    details = list(iter_extract_details(messages))
 
+    for bank_name, counts in get_parser_stats().items():
+        if counts['miss'] or counts['fail']:
+            logger.info(f"Parser fast path for {bank_name}: {counts['hit']} hits, {counts['miss']} misses, "
+                        f"{counts['fail']} unparseable")
     return details
+
+
+def iter_extract_details(messages):
+    """
+    Streaming counterpart of extract_details.
+    Args:
+        messages (iterable): (message, year) or (message, year, matched keywords) tuples.
+    Yields:
+        dict: The details of each transaction; messages that cannot be parsed are skipped.
+    """
+    for message in messages:
+        transaction = parse_message(*message)
+        if transaction is not None:
+            yield transaction
@@ -1,7 +1,6 @@
-from utils.util import log_execution
-from collections import defaultdict
+from utils.util import log_execution, group_by_account
 import math
-from datetime import datetime
+from operator import itemgetter
 
 
 @log_execution(verbose=False)
@@ -11,6 +10,7 @@ def verify_transactions(transactions, threshold):
 
     Args:
         transactions (list): The list of transaction details.
+        threshold (int): Gaps up to this amount are not reported in the note.
 
     Returns:
         list: The list of transactions with a 'note' field indicating any discrepancies found.
@@ -20,59 +20,86 @@ def verify_transactions(transactions, threshold):
 
     threshold = int(threshold)
     # Group transactions by account number
-    transactions_by_account = defaultdict(list)
-    for transaction in transactions:
-        account_number = transaction['account_number']
-        transactions_by_account[account_number].append(transaction)
+    transactions_by_account = group_by_account(transactions)
 
     # process each account's transactions
     for account_number, account_transactions in transactions_by_account.items():
         # Sort transactions by date for the current account
-        account_transactions.sort(key=lambda x: datetime.strptime((x['date']), '%Y-%m-%d'))
+        account_transactions.sort(key=itemgetter('date'))
+        verify_account(account_transactions, threshold)
+    return transactions
+
+
+def verify_account(account_transactions, threshold, resume=None):
+    """
+    Runs the balance check over one account's date-sorted transactions, updating them in place.
+    Balances are compared at the end of every day, so the state before the account's last day is
+    all it takes to extend the verification when transactions are appended later.
 
+    Args:
+        account_transactions (list): The account's transactions, sorted by date.
+        threshold (int): Gaps up to this amount are not reported in the note.
+        resume (dict, optional): A checkpoint returned by an earlier call on a prefix of the same
+            transactions. Transactions before its index are taken as verified and left untouched;
+            the ones from it on must be fresh (unverified) copies.
+
+    Returns:
+        dict: The checkpoint at the start of the last day: 'index', 'running_balance' and
+            'running_balance_only'. Index 0 means the account has to be verified from scratch.
+    """
+    threshold = int(threshold)
+    start = resume['index'] if resume else 0
+    if start:
+        running_balance = resume['running_balance']
+        running_balance_only = resume['running_balance_only']
+    else:
         # Initalize starting balance for the current account
         starting_balance = float(account_transactions[0]['balance'])
         running_balance = starting_balance
         running_balance_only = starting_balance
-        first_transaction = True
+    first_transaction = start == 0
+    checkpoint = {'index': start, 'running_balance': running_balance, 'running_balance_only': running_balance_only}
 
-        # Create a init day to process the running balance compare.
-        prev_date = account_transactions[0]['date']
+    # Create a init day to process the running balance compare.
+    prev_date = account_transactions[start]['date']
 
-        for i, transaction in enumerate(account_transactions):
-            if (i < len(account_transactions)-1):
-                now_date = account_transactions[i+1]['date']
-            else:
-                now_date = None
-            amount = float(transaction['amount'])
-            reported_balance = float(transaction['balance'])
+    for i in range(start, len(account_transactions)):
+        transaction = account_transactions[i]
+        if i > start and transaction['date'] != account_transactions[i-1]['date']:
+            checkpoint = {'index': i, 'running_balance': running_balance,
+                          'running_balance_only': running_balance_only}
+        if (i < len(account_transactions)-1):
+            now_date = account_transactions[i+1]['date']
+        else:
+            now_date = None
+        amount = float(transaction['amount'])
+        reported_balance = float(transaction['balance'])
 
-            if first_transaction:
-                first_transaction = False
-                transaction['note'] = ''
-                transaction['running_balance'] = "{:2f}".format(running_balance_only)
-            else:
-                
-                running_balance += amount
-                running_balance_only += amount
-                if now_date != prev_date:
-                    if not math.isclose(running_balance, reported_balance, abs_tol=0):
-                        if reported_balance == 0:
-                            transaction['balance'] = running_balance
-                            transaction['note'] = "没有余额信息,计算应为: {:.2f}".format(running_balance)
-                            transaction['gap'] = ""
-                        else:
-                            # print(f'Discrepancy found for account {account_number}: running balance is {running_balance} \
-                            # but the reported balance is {reported_balance}.')
-                            if abs(running_balance - reported_balance) > threshold:
-                                transaction['note'] = '阶段性余额不一致,预计应为{:.2f} 该阶段内差额为 {:.2f}'.format(running_balance, -running_balance+reported_balance)
-                                transaction['gap'] = '{:.2f}'.format(-running_balance+reported_balance)
-                            running_balance = reported_balance
-                        transaction['running_balance'] = "{:.2f}".format(running_balance_only)
-                    else:
-                        transaction['note'] = ''
+        if first_transaction:
+            first_transaction = False
+            transaction['note'] = ''
+            transaction['running_balance'] = "{:2f}".format(running_balance_only)
+        else:
+            
+            running_balance += amount
+            running_balance_only += amount
+            if now_date != prev_date:
+                if not math.isclose(running_balance, reported_balance, abs_tol=0):
+                    if reported_balance == 0:
+                        transaction['balance'] = running_balance
+                        transaction['note'] = "没有余额信息,计算应为: {:.2f}".format(running_balance)
                         transaction['gap'] = ""
-                        transaction['running_balance'] = "{:.2f}".format(running_balance_only)
-            prev_date = now_date
-    return transactions
-
+                    else:
+                        # print(f'Discrepancy found for account {account_number}: running balance is {running_balance} \
+                        # but the reported balance is {reported_balance}.')
+                        if abs(running_balance - reported_balance) > threshold:
+                            transaction['note'] = '阶段性余额不一致,预计应为{:.2f} 该阶段内差额为 {:.2f}'.format(running_balance, -running_balance+reported_balance)
+                            transaction['gap'] = '{:.2f}'.format(-running_balance+reported_balance)
+                        running_balance = reported_balance
+                    transaction['running_balance'] = "{:.2f}".format(running_balance_only)
+                else:
+                    transaction['note'] = ''
+                    transaction['gap'] = ""
+                    transaction['running_balance'] = "{:.2f}".format(running_balance_only)
+        prev_date = now_date
+    return checkpoint
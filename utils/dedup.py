@@ -0,0 +1,221 @@
+# dedup.py
+
+import heapq
+import unicodedata
+from collections import Counter
+from datetime import date
+from functools import lru_cache
+from itertools import groupby, repeat
+from operator import itemgetter
+from utils.util import log_execution, setup_logger
+
+
+logger = setup_logger()
+
+# The 'dedup' section of config.yaml; keys left out keep these values.
+DEFAULT_RULES = {
+    'enabled': True,
+    # What two transactions must share to be the same SMS. 'text' stands for the normalised
+    # counterparties, type and bank; leaving fields out matches near-duplicates more loosely.
+    # Without 'date' nothing is evicted, the index then grows with the number of distinct keys.
+    'fields': ['account_number', 'date', 'amount', 'balance', 'text'],
+    # Copies whose dates are up to this many days apart still match (e.g. exports that inferred
+    # the date differently); 0 requires the same day.
+    'window_days': 0,
+    # Repeats inside one file are genuine by default (the same transfer twice a day), only copies
+    # from other files are dropped. True drops repeats inside a file as well.
+    'within_file': False,
+}
+TEXT_FIELDS = ('object1', 'object2', 'type', 'bank_name')
+KEY_FIELDS = {'account_number', 'date', 'amount', 'balance', 'text'}
+
+
+def dedup_rules(config):
+    """
+    Returns:
+        dict: The deduplication rules from config.yaml merged over DEFAULT_RULES, or None when
+            there is no 'dedup' section or it is disabled.
+    Raises:
+        ValueError: If an unknown key field is configured.
+    """
+    section = config.get('dedup')
+    if not section:
+        return None
+    rules = {**DEFAULT_RULES, **(section if isinstance(section, dict) else {})}
+    if not rules['enabled']:
+        return None
+    unknown = [field for field in rules['fields'] if field not in KEY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown dedup fields {unknown}, choose from {sorted(KEY_FIELDS)}")
+    return rules
+
+
+@lru_cache(maxsize=None)
+def day_number(date_key):
+    return date(date_key // 10000, date_key // 100 % 100, date_key % 100).toordinal()
+
+
+def normalize_text(value):
+    """
+    Folds the differences exports of the same SMS show: full-width characters, case and whitespace.
+    """
+    return ''.join(unicodedata.normalize('NFKC', str(value)).casefold().split())
+
+
+@lru_cache(maxsize=1 << 16)
+def normalize_texts(values):
+    """
+    normalize_text over the TEXT_FIELDS values of a transaction. Memoised, counterparties and
+    bank names repeat throughout an archive.
+    """
+    return tuple(normalize_text(value) for value in values)
+
+
+def normalize_number(value):
+    """
+    Compares amounts and balances by value ('+100.00', '100.0' and 100 are the same); anything
+    that is not a number ('Unknown') is compared as text.
+    """
+    try:
+        return round(float(value) * 100)
+    except (TypeError, ValueError):
+        return normalize_text(value)
+
+
+class Deduplicator:
+    """
+    Streaming duplicate filter for transactions coming from overlapping message exports.
+
+    Transactions are expected in date order per account. The index is a hash map per account from
+    the key (the configured fields except the date) to the recent days it was seen on, with how many
+    copies every source file brought and how many were kept. A copy is dropped when its file has not
+    brought more of them than were already kept, so the result keeps the largest count any single
+    file has. Days older than the window are evicted as an account's date moves on, which bounds
+    the memory per account by the transactions of window_days + 1 days.
+    """
+
+    def __init__(self, rules=None):
+        rules = {**DEFAULT_RULES, **(rules or {})}
+        # The index is per account, so the account and the date are not part of the key itself.
+        self.match_account = 'account_number' in rules['fields']
+        self.match_date = 'date' in rules['fields']
+        self.key_parts = [self.key_part(field) for field in rules['fields']
+                          if field not in ('account_number', 'date')]
+        self.window = int(rules['window_days'])
+        self.within_file = rules['within_file']
+        # account number -> key -> [[day, {source: copies}, copies kept]]
+        self.index = {}
+        self.last_day = {}
+        self.dropped = Counter()
+
+    @staticmethod
+    def key_part(field):
+        if field == 'text':
+            text_values = itemgetter(*TEXT_FIELDS)
+            return lambda transaction: normalize_texts(text_values(transaction))
+        return lambda transaction: normalize_number(transaction[field])
+
+    def key(self, transaction):
+        return tuple([part(transaction) for part in self.key_parts])
+
+    def evict(self, account_entries, day):
+        if not self.window:
+            account_entries.clear()
+            return
+        for key in list(account_entries):
+            entries = [entry for entry in account_entries[key] if entry[0] >= day - self.window]
+            if entries:
+                account_entries[key] = entries
+            else:
+                del account_entries[key]
+
+    def is_duplicate(self, transaction, source):
+        """
+        Records one transaction and tells whether it is a copy of one already kept.
+        Args:
+            transaction (dict): The transaction details.
+            source: Identifies the message file the transaction came from.
+        Returns:
+            bool: True if the transaction should be dropped.
+        """
+        account_number = transaction['account_number'] if self.match_account else None
+        if not self.match_date:
+            day = 0
+        else:
+            # Same-day matching compares the yyyymmdd keys themselves, a window needs day numbers.
+            day = day_number(transaction['date']) if self.window else transaction['date']
+        account_entries = self.index.setdefault(account_number, {})
+        last_day = self.last_day.get(account_number)
+        if last_day is None or day > last_day:
+            if last_day is not None:
+                self.evict(account_entries, day)
+            self.last_day[account_number] = day
+
+        entries = account_entries.setdefault(self.key(transaction), [])
+        entry = next((entry for entry in entries if abs(entry[0] - day) <= self.window), None)
+        if entry is None:
+            entries.append([day, {source: 1}, 1])
+            return False
+        copies = entry[1][source] = entry[1].get(source, 0) + 1
+        if not self.within_file and copies > entry[2]:
+            entry[2] = copies
+            return False
+        self.dropped[source] += 1
+        return True
+
+    def iter_unique(self, tagged_transactions):
+        """
+        Within a day, an account's transactions are taken source by source, the source with the
+        most of them first (ties in stream order). The fullest export of the day thus sets the
+        order of the copies, and an export that starts mid-day cannot put its late transactions
+        ahead of the earlier ones, whatever the order the files are listed in.
+        Args:
+            tagged_transactions (iterable): (source, transaction) pairs in date order.
+        Yields:
+            dict: The transactions that are not duplicates.
+        """
+        for _, day_items in groupby(tagged_transactions, key=lambda item: item[1]['date']):
+            # account number -> source -> the account's transactions of the day from that source
+            by_account = {}
+            for source, transaction in day_items:
+                by_account.setdefault(transaction['account_number'], {}).setdefault(source, []).append(transaction)
+            for by_source in by_account.values():
+                for source, transactions in sorted(by_source.items(), key=lambda item: len(item[1]), reverse=True):
+                    for transaction in transactions:
+                        if not self.is_duplicate(transaction, source):
+                            yield transaction
+
+    def report(self):
+        """
+        Logs how many duplicates were dropped from every source file.
+        """
+        for source, count in self.dropped.items():
+            logger.info(f"{source}: {count} duplicate transactions dropped")
+
+
+def merge_tagged(per_file_transactions, sources):
+    """
+    Merges date-sorted per-file transactions into (source, transaction) pairs in date order;
+    same-day transactions keep their file order (Deduplicator.iter_unique then orders a day's
+    sources by size).
+    """
+    streams = [zip(repeat(source), transactions) for source, transactions in zip(sources, per_file_transactions)]
+    return heapq.merge(*streams, key=lambda item: item[1]['date'])
+
+
+@log_execution(verbose=False)
+def deduplicate_transactions(per_file_transactions, sources, rules=None):
+    """
+    Merges per-file transaction lists by date and drops the copies that overlapping exports
+    contain, in one pass (see Deduplicator).
+    Args:
+        per_file_transactions (list): One date-sorted list of transactions per message file.
+        sources (list): The file names, in the same order.
+        rules (dict, optional): The deduplication rules, see DEFAULT_RULES.
+    Returns:
+        list: The unique transactions in date order, as merge_transactions would return them.
+    """
+    deduplicator = Deduplicator(rules)
+    transactions = list(deduplicator.iter_unique(merge_tagged(per_file_transactions, sources)))
+    deduplicator.report()
+    return transactions
@@ -0,0 +1,242 @@
+# metrics.py
+
+import cProfile
+import json
+import time
+import tracemalloc
+from collections.abc import Mapping, Sized
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# Per-stage totals recorded by utils.util.log_execution: stage name -> counters.
+stage_metrics = {}
+# Highest traced memory seen so far by each open stage, innermost last (only while tracemalloc runs).
+_memory_stack = []
+
+
+def count_items(value):
+    """
+    Number of items in a stage's list-like argument or result, None for anything else
+    (paths, config dicts, generators).
+    """
+    if isinstance(value, Sized) and not isinstance(value, (str, bytes, Mapping)):
+        return len(value)
+    return None
+
+
+def start_memory_tracing():
+    """
+    Starts tracemalloc so stages also record their peak memory. Tracing slows Python code down
+    noticeably, which is why it is opt-in.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def stage(name, items_in=None):
+    """
+    Measures one call of a pipeline stage: monotonic wall time, process CPU time and, while
+    tracemalloc runs, the peak traced memory. Nested stages are measured separately and the
+    outer stage's peak still covers them.
+    Args:
+        name (str): The stage name, usually the function name.
+        items_in (int, optional): The number of items handed to the stage.
+    Yields:
+        dict: The call's record; set 'items_out' on it before leaving the block.
+    """
+    record = {'items_in': items_in, 'items_out': None}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        if _memory_stack:
+            _memory_stack[-1] = max(_memory_stack[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        _memory_stack.append(0)
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall'] = time.perf_counter() - start_wall
+        record['cpu'] = time.process_time() - start_cpu
+        peak = None
+        if tracing and tracemalloc.is_tracing():
+            peak = max(_memory_stack.pop(), tracemalloc.get_traced_memory()[1])
+            if _memory_stack:
+                _memory_stack[-1] = max(_memory_stack[-1], peak)
+        record_stage(name, record['wall'], record['cpu'], peak, record['items_in'], record['items_out'])
+
+
+def record_stage(name, wall, cpu, peak_memory=None, items_in=None, items_out=None):
+    """
+    Adds one call to the totals of a stage. Stages called repeatedly (e.g. verification once per
+    account in the streaming pipeline) accumulate times and item counts and keep the highest peak.
+    """
+    add_stage_totals(name, 1, wall, cpu, peak_memory, items_in, items_out)
+
+
+def add_stage_totals(name, calls, wall, cpu, peak_memory=None, items_in=None, items_out=None):
+    """
+    Adds calls and their summed counters to the totals of a stage, see record_stage.
+    """
+    metrics = stage_metrics.setdefault(name, {
+        'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+        'peak_memory_bytes': None, 'items_in': None, 'items_out': None,
+    })
+    metrics['calls'] += calls
+    metrics['wall_seconds'] += wall
+    metrics['cpu_seconds'] += cpu
+    if peak_memory is not None:
+        metrics['peak_memory_bytes'] = max(metrics['peak_memory_bytes'] or 0, peak_memory)
+    if items_in is not None:
+        metrics['items_in'] = (metrics['items_in'] or 0) + items_in
+    if items_out is not None:
+        metrics['items_out'] = (metrics['items_out'] or 0) + items_out
+
+
+def get_stage_metrics():
+    """
+    Returns a copy of the stage totals recorded so far, e.g. to send them back from a worker process.
+    """
+    return {name: dict(metrics) for name, metrics in stage_metrics.items()}
+
+
+def merge_stage_metrics(metrics):
+    """
+    Adds stage totals returned by get_stage_metrics(), e.g. from a worker process, to this process's
+    totals. The times of stages run in parallel add up, like CPU time across a pool.
+    """
+    for name, totals in metrics.items():
+        add_stage_totals(name, totals['calls'], totals['wall_seconds'], totals['cpu_seconds'],
+                         totals['peak_memory_bytes'], totals['items_in'], totals['items_out'])
+
+
+def reset_metrics():
+    """
+    Clears the stage totals, e.g. between benchmark runs.
+    """
+    stage_metrics.clear()
+
+
+def parser_summary():
+    """
+    Returns:
+        dict: bank tag -> fast-path hits, generic-cascade misses, parse failures, the failure rate
+            and the generic-cascade regex fallbacks taken, from utils.parsers.
+    """
+    from utils.parsers import get_parser_stats
+    summary = {}
+    for bank, counts in get_parser_stats().items():
+        counts = dict(counts)
+        hits, misses, failures = counts.pop('hit', 0), counts.pop('miss', 0), counts.pop('fail', 0)
+        total = hits + misses
+        summary[bank] = {
+            'hit': hits,
+            'miss': misses,
+            'fail': failures,
+            'failure_rate': failures / total if total else 0.0,
+            'fallbacks': counts,
+        }
+    return summary
+
+
+def run_summary(**extra):
+    """
+    Builds the machine-readable summary of the run so far.
+    Args:
+        extra: Additional top-level fields, e.g. the total wall time measured by main.py.
+    Returns:
+        dict: 'finished_at', 'stages' (see record_stage), 'parsers' (see parser_summary) and the extras.
+    """
+    return {
+        'finished_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        **extra,
+        'stages': get_stage_metrics(),
+        'parsers': parser_summary(),
+    }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus(summary):
+    """
+    Renders a run summary in the Prometheus text exposition format, e.g. for the node_exporter
+    textfile collector.
+    Args:
+        summary (dict): As returned by run_summary.
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        samples = [(labels, value) for labels, value in samples if value is not None]
+        if not samples:
+            return
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{_label(label)}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    stages = summary['stages'].items()
+    metric('sms_stage_calls_total', 'counter', 'Calls of a pipeline stage.',
+           [({'stage': name}, m['calls']) for name, m in stages])
+    metric('sms_stage_wall_seconds_total', 'counter', 'Monotonic wall time spent in a pipeline stage.',
+           [({'stage': name}, m['wall_seconds']) for name, m in stages])
+    metric('sms_stage_cpu_seconds_total', 'counter', 'Process CPU time spent in a pipeline stage.',
+           [({'stage': name}, m['cpu_seconds']) for name, m in stages])
+    metric('sms_stage_peak_memory_bytes', 'gauge', 'Peak traced memory during a pipeline stage.',
+           [({'stage': name}, m['peak_memory_bytes']) for name, m in stages])
+    metric('sms_stage_items_in_total', 'counter', 'Items handed to a pipeline stage.',
+           [({'stage': name}, m['items_in']) for name, m in stages])
+    metric('sms_stage_items_out_total', 'counter', 'Items returned by a pipeline stage.',
+           [({'stage': name}, m['items_out']) for name, m in stages])
+
+    parsers = summary['parsers'].items()
+    metric('sms_parser_messages_total', 'counter', 'Parsed messages per bank and parser outcome.',
+           [({'bank': bank, 'result': result}, p[result]) for bank, p in parsers for result in ('hit', 'miss', 'fail')])
+    metric('sms_parser_fallbacks_total', 'counter', 'Generic-cascade regex fallbacks taken per bank.',
+           [({'bank': bank, 'fallback': fallback}, count) for bank, p in parsers
+            for fallback, count in p['fallbacks'].items()])
+    metric('sms_parser_failure_ratio', 'gauge', 'Share of a bank\'s messages that could not be parsed.',
+           [({'bank': bank}, p['failure_rate']) for bank, p in parsers])
+
+    if 'wall_seconds' in summary:
+        metric('sms_run_wall_seconds', 'gauge', 'Wall time of the whole run.', [({}, summary['wall_seconds'])])
+    return '\n'.join(lines) + '\n'
+
+
+def write_summary(path, **extra):
+    """
+    Writes the run summary to path: Prometheus text if it ends in .prom, JSON otherwise.
+    """
+    summary = run_summary(**extra)
+    with open(path, 'w', encoding='utf-8') as file:
+        if path.endswith('.prom'):
+            file.write(to_prometheus(summary))
+        else:
+            json.dump(summary, file, ensure_ascii=False, indent=2)
+    return summary
+
+
+@contextmanager
+def profiled(path=None):
+    """
+    Runs the block under cProfile and dumps the stats to path (open with `python -m pstats path` or
+    snakeviz). Does nothing without a path, so callers can wrap unconditionally. Stage functions keep
+    their names through log_execution, so sampling profilers such as
+    `py-spy record -o run.svg -- python main.py` attribute time to the same stages.
+    """
+    if not path:
+        yield None
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
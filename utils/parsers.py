@@ -0,0 +1,251 @@
+# parsers.py
+
+import re
+from collections import Counter, defaultdict
+from utils.util import parse_date_key, format_date_key, setup_logger
+
+
+logger = setup_logger()
+
+
+# Generic fallback patterns, compiled once instead of on every message.
+DATE_RE = re.compile(r'\d+月\d+日')
+ACCOUNT_RE = re.compile(r'(\d+账户|账户\d+|\d+公司账户|\d+个人账户)')
+ACCOUNT_TAIL_RE = re.compile(r'尾号(\d+)')
+DIGITS_RE = re.compile(r'\d+')
+OBJECT1_RE = re.compile(r'(.+?)于')
+OBJECT2_RE = re.compile(r'向(.+?)完成')
+AMOUNT_RE = re.compile(r'(?:收入|支出|人民币|金额为)((?:-)?\d+\.\d{2})(?:元|人民币)?')
+AMOUNT_FALLBACK_RE = re.compile(r'金额为((?:-)?\d+\.\d{2})')
+AMOUNT_LAST_RE = re.compile(r'(收入|支出)((?:-)?\d+\.\d{2})(人民币|元)')
+BALANCE_RE = re.compile(r'余额(\d+\.\d{2})')
+BANK_RE = re.compile(r'【(.*?)】|\[(.*?银行)\]')
+
+# Bank-specific fast paths: bank tag -> list of compiled patterns.
+# Every pattern pulls all fields with one match through named groups
+# (date, account, amount, balance and optionally object1/object2). The
+# character classes are kept strict so a fast-path hit always yields the
+# same fields as the generic cascade; anything else falls through to it.
+# The cascade takes object2 from the first 向, so object1 must not contain
+# one. python -m benchmarks.parser_parity checks both agree on edge cases.
+PARSERS = defaultdict(list)
+
+# Row layout of the transaction dicts built by build_record. 'date' is an integer yyyymmdd key
+# throughout the pipeline and only formatted as 'YYYY-MM-DD' on export (see export_values).
+FIELDS = ['date', 'object1', 'object2', 'account_number', 'type', 'amount', 'balance',
+          'bank_name', 'note', 'gap', 'running_balance']
+
+# Keywords that decide the transaction type, see classify_transaction.
+INCOME_KEYWORDS = ('收入', '转存', '结息')
+OUTCOME_KEYWORDS = ('支出', '支付支取', '转支', '通知存款交易')
+TYPE_KEYWORDS = INCOME_KEYWORDS + OUTCOME_KEYWORDS
+
+# Per-bank parser counters: bank tag -> Counter of 'hit' (fast path), 'miss' (generic cascade),
+# 'fail' (unparseable) and the generic-cascade fallbacks taken ('account_tail', 'amount_fallback',
+# 'amount_last').
+parser_stats = defaultdict(Counter)
+
+
+def register_parser(bank_name, *patterns):
+    """
+    Registers one or more fast-path patterns for a bank.
+    Args:
+        bank_name (str): The bank tag as it appears between 【】 in the message.
+        patterns (str): Regular expressions with named groups for the transaction fields.
+    """
+    PARSERS[bank_name].extend(re.compile(pattern) for pattern in patterns)
+
+
+register_parser(
+    '中国农业银行',
+    # 【中国农业银行】陈晓明于01月22日17:03向您尾号2222账户完成转存交易人民币100.00，余额2100.00。
+    r'(?P<object1>【中国农业银行】[^于向\d账【]*)于(?P<date>\d+月\d+日)[\d:]*'
+    r'向(?P<object2>[^完于\d账]*?(?P<account>\d+)账户[^完于]*?)完成[^\d于]*?'
+    r'人民币(?P<amount>-?\d+\.\d{2})，余额(?P<balance>\d+\.\d{2})[^于余]*$',
+    # 【中国农业银行】您尾号2222账户01月24日23:03向何厚铧完成转支交易人民币-200.00，余额1800.00。
+    r'【中国农业银行】您尾号(?P<account>\d+)账户(?P<date>\d+月\d+日)[\d:]*'
+    r'向(?P<object2>[^完于\d账]+?)完成[^\d于]*?'
+    r'人民币(?P<amount>-?\d+\.\d{2})，余额(?P<balance>\d+\.\d{2})[^于余]*$',
+)
+
+register_parser(
+    '中国银行',
+    # 您的借记卡账户8811，于11月08日网上支付收入人民币10.98元,交易后余额341.17【中国银行】
+    r'(?P<object1>您的借记卡账户(?P<account>\d+)，)于(?P<date>\d+月\d+日)[^\d于向余]*?'
+    r'人民币(?P<amount>-?\d+\.\d{2})元?,交易后余额(?P<balance>\d+\.\d{2})【中国银行】\s*$',
+)
+
+
+def sniff_bank(message):
+    """
+    Cheaply finds the bank tag of a message without running a regex.
+    Args:
+        message (str): The raw message.
+    Returns:
+        str or None: The text between the first 【 and 】, or None if there is no tag.
+    """
+    start = message.find('【')
+    if start < 0:
+        return None
+    end = message.find('】', start)
+    if end < 0:
+        return None
+    return message[start + 1:end]
+
+
+def classify_transaction(message, amount, matched=None):
+    """
+    Decides the transaction type and the sign to put in front of the amount.
+    Args:
+        message (str): The raw message.
+        amount (str): The amount extracted from the message.
+        matched (frozenset, optional): The keywords already found in the message by the
+            keyword prefilter; must cover TYPE_KEYWORDS. Saves scanning the message again.
+    Returns:
+        tuple: (transaction_type, amount_sign)
+    """
+    if matched is None:
+        matched = [keyword for keyword in TYPE_KEYWORDS if keyword in message]
+    if any(keyword in matched for keyword in INCOME_KEYWORDS):
+        return 'income', '+'
+    elif any(keyword in matched for keyword in OUTCOME_KEYWORDS) or '-' in amount:
+        return 'outcome', '-'
+    return 'income', ''
+
+
+def build_record(message, year, date_str, account_number, object1, object2, amount, balance, bank_name,
+                 matched=None):
+    """
+    Assembles the transaction dict shared by the fast and the generic parsers.
+    """
+    date = parse_date_key(date_str, year)
+    transaction_type, amount_sign = classify_transaction(message, amount, matched)
+    amount = f"{amount_sign}{amount}" if (amount != 'Unknown' and '-' not in amount) else amount
+    return {
+        'date': date,
+        'object1': object1,
+        'object2': object2,
+        'account_number': account_number,
+        'type': transaction_type,
+        'amount': amount,
+        'balance': balance,
+        'bank_name': bank_name,
+        'note': '',
+        'gap': '',
+        'running_balance': "",
+    }
+
+
+def export_values(transaction):
+    """
+    Returns the transaction's values in FIELDS order with the date key formatted, for the report writers.
+    """
+    values = list(transaction.values())
+    values[0] = format_date_key(values[0])
+    return values
+
+
+def parse_generic(message, year, matched=None, stats=None):
+    """
+    Parses a message with the generic regex cascade, for banks without a fast path.
+    Args:
+        message (str): The raw message.
+        year (int): The year inferred for the message.
+        matched (frozenset, optional): Keywords found by the prefilter, see classify_transaction.
+        stats (Counter, optional): Counts the fallback patterns the cascade had to use.
+    Returns:
+        dict: The transaction details.
+    Raises:
+        AttributeError: If no date or amount can be found in the message.
+    """
+    if stats is None:
+        stats = Counter()
+    date_str = DATE_RE.search(message).group()
+
+    account_number_match = ACCOUNT_RE.search(message)
+    if not account_number_match:
+        stats['account_tail'] += 1
+        account_number_match = ACCOUNT_TAIL_RE.search(message)
+    # Removing "账户" to get only the account number
+    account_number = DIGITS_RE.search(account_number_match.group(0)).group(0) if account_number_match else ' '
+
+    object1_match = OBJECT1_RE.search(message)
+    object2_match = OBJECT2_RE.search(message)
+    object1 = object1_match.group(1) if object1_match else f"您尾号{account_number}账户"
+    object2 = object2_match.group(1) if object2_match else ' '
+
+    amount_match = AMOUNT_RE.search(message)
+    if amount_match:
+        amount = amount_match.group(1)
+    else:
+        amount_match = AMOUNT_FALLBACK_RE.search(message)
+        stats['amount_fallback' if amount_match else 'amount_last'] += 1
+        amount = amount_match.group(1) if amount_match else AMOUNT_LAST_RE.search(message).group(2)
+
+    balance_match = BALANCE_RE.search(message)
+    balance = balance_match.group(1) if balance_match else '0.00'
+
+    bank_name_match = BANK_RE.search(message)
+    bank_name = bank_name_match.group(1) or bank_name_match.group(2) if bank_name_match else 'Unknown'
+
+    return build_record(message, year, date_str, account_number, object1, object2, amount, balance, bank_name,
+                        matched)
+
+
+def parse_message(message, year, matched=None):
+    """
+    Parses a message through the bank's fast path, falling back to the generic cascade.
+    A message neither can parse (no date or amount, or an invalid date) is logged, counted
+    as a failure for its bank and skipped.
+    Args:
+        message (str): The raw message.
+        year (int): The year inferred for the message.
+        matched (frozenset, optional): Keywords found by the prefilter, see classify_transaction.
+    Returns:
+        dict or None: The transaction details, or None if the message cannot be parsed.
+    """
+    bank_name = sniff_bank(message)
+    patterns = PARSERS.get(bank_name)
+    stats = parser_stats[bank_name or 'Unknown']
+    try:
+        if patterns:
+            for pattern in patterns:
+                match = pattern.match(message)
+                if match:
+                    stats['hit'] += 1
+                    fields = match.groupdict()
+                    account_number = fields['account']
+                    return build_record(
+                        message, year, fields['date'], account_number,
+                        fields.get('object1') or f"您尾号{account_number}账户",
+                        fields.get('object2') or ' ',
+                        fields['amount'], fields['balance'], bank_name, matched,
+                    )
+        stats['miss'] += 1
+        return parse_generic(message, year, matched, stats)
+    except (AttributeError, ValueError) as e:
+        stats['fail'] += 1
+        logger.warning(f"Could not parse message ({e}): {message}")
+        return None
+
+
+def get_parser_stats():
+    """
+    Returns the parser counters collected so far, keyed by bank tag, with 'hit', 'miss' and 'fail' always present.
+    """
+    return {bank: {'hit': 0, 'miss': 0, 'fail': 0, **counts} for bank, counts in parser_stats.items()}
+
+
+def merge_parser_stats(stats):
+    """
+    Adds counters returned by get_parser_stats(), e.g. from a worker process, to this process's counters.
+    """
+    for bank, counts in stats.items():
+        parser_stats[bank].update(counts)
+
+
+def reset_parser_stats():
+    """
+    Clears the parser counters.
+    """
+    parser_stats.clear()
@@ -0,0 +1,205 @@
+# pipeline.py
+
+import json
+import os
+import tempfile
+from utils.util import log_execution, setup_logger
+from utils.cache import TransactionCache, file_digest
+from utils.data_extraction import (iter_sorted_messages, iter_extract_messages, iter_extract_details,
+                                   iter_tagged_transactions, list_message_files, parse_message_files,
+                                   merge_transactions)
+from utils.dedup import Deduplicator, dedup_rules, deduplicate_transactions
+from utils.data_verification import verify_transactions
+from utils.sinks import open_sinks, close_sinks, remove_file
+from utils.scheduler import verify_and_export
+from utils.charts import export_charts, charts_enabled, calculate_monthly_totals, plot_monthly_totals
+
+
+logger = setup_logger()
+
+
+def spill_by_account(transactions, spill_dir, tagged=False):
+    """
+    Groups a transaction stream by account number, spilling every account to its own JSON-lines file.
+    Only one transaction is held in memory at a time.
+    Args:
+        transactions (iterable): The transaction dicts, in date order.
+        spill_dir (str): The directory for the per-account spill files.
+        tagged (bool): The stream holds (source, transaction) pairs, which are spilled as pairs.
+    Returns:
+        dict: account number -> (spill file path, transaction count), in first-seen order.
+    """
+    spill_files = {}
+    accounts = {}
+    try:
+        for item in transactions:
+            account_number = (item[1] if tagged else item)['account_number']
+            spill_file = spill_files.get(account_number)
+            if spill_file is None:
+                path = os.path.join(spill_dir, f'{len(spill_files)}.jsonl')
+                spill_file = spill_files[account_number] = open(path, 'w', encoding='utf-8')
+                accounts[account_number] = [path, 0]
+            spill_file.write(json.dumps(item, ensure_ascii=False))
+            spill_file.write('\n')
+            accounts[account_number][1] += 1
+    finally:
+        for spill_file in spill_files.values():
+            spill_file.close()
+    return {account_number: tuple(entry) for account_number, entry in accounts.items()}
+
+
+def load_account(path, source_order=None):
+    """
+    Loads one account's spilled transactions and puts them in date order.
+    Args:
+        path (str): The spill file written by spill_by_account.
+        source_order (dict, optional): For a tagged spill, source -> its position in the directory.
+            Same-day transactions are then ordered by source, as merge_tagged orders them.
+    Returns:
+        list: The account's transactions, stably sorted by date, or (source, transaction) pairs
+            for a tagged spill.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        account_transactions = [json.loads(line) for line in file]
+    # The stable sort on the yyyymmdd key keeps same-day order.
+    if source_order is None:
+        account_transactions.sort(key=lambda transaction: transaction['date'])
+    else:
+        account_transactions.sort(key=lambda item: (item[1]['date'], source_order[item[0]]))
+    return account_transactions
+
+
+@log_execution(verbose=False)
+def run_streaming_pipeline(config):
+    """
+    Runs read -> filter -> parse -> verify -> export lazily, one account at a time.
+    Messages are k-way merged from the per-file streams and spilled per account to a
+    temporary directory, so peak memory is bounded by the largest account rather than the archive.
+    Args:
+        config (dict): The configuration parameters read from config.yaml.
+    Returns:
+        dict: account number -> number of transactions exported.
+    """
+    rules = dedup_rules(config)
+    deduplicator = None
+    if rules:
+        # Per-file streams, so copies from overlapping exports can be told apart. They are dropped
+        # once an account is loaded back in date order: an export with out-of-order runs would
+        # otherwise bring copies after their day had left the index.
+        if 'account_number' not in rules['fields']:
+            logger.warning("The streaming pipeline only matches duplicates within an account")
+        deduplicator = Deduplicator(rules)
+        source_order = {file_name: i for i, file_name in enumerate(list_message_files(config['message_dir']))}
+        transactions = iter_tagged_transactions(config['message_dir'], config['initial_year'], config['keywords'],
+                                                errors=config.get('decode_errors', 'replace'))
+    else:
+        messages = iter_sorted_messages(config['message_dir'], config['initial_year'],
+                                        errors=config.get('decode_errors', 'replace'))
+        bank_messages = iter_extract_messages(messages, config['keywords'])
+        transactions = iter_extract_details(bank_messages)
+
+    exported = {}
+    monthly_totals = {}
+    charts = charts_enabled(config)
+    sinks = open_sinks(config)
+    try:
+        with tempfile.TemporaryDirectory(prefix='sms-spill-') as spill_dir:
+            accounts = spill_by_account(transactions, spill_dir, tagged=deduplicator is not None)
+            for account_number, (path, count) in accounts.items():
+                if deduplicator is None:
+                    account_transactions = load_account(path)
+                else:
+                    account_transactions = list(deduplicator.iter_unique(load_account(path, source_order)))
+                    count = len(account_transactions)
+                verify_transactions(account_transactions, threshold=config['threshold'])
+                for sink in sinks:
+                    sink.write(account_number, account_transactions)
+                if charts:
+                    # An account's monthly totals are a few numbers, they are kept for the charts.
+                    monthly_totals.update(calculate_monthly_totals(account_transactions))
+                exported[account_number] = count
+                os.remove(path)
+    finally:
+        close_sinks(sinks)
+    if deduplicator is not None:
+        deduplicator.report()
+    if monthly_totals:
+        plot_monthly_totals(monthly_totals, config['output_dir'], dpi=config.get('chart_dpi', 300))
+    logger.info(f"Streaming pipeline exported {sum(exported.values())} transactions for {len(exported)} accounts")
+    return exported
+
+
+@log_execution(verbose=False)
+def run_incremental_pipeline(config, workers=1, rebuild=False):
+    """
+    Runs the batch pipeline against the on-disk transaction cache: only files whose content hash
+    changed are parsed again, and only the accounts they touch are re-verified and re-exported.
+    Args:
+        config (dict): The configuration parameters read from config.yaml.
+        workers (int): The number of processes used to parse changed files and to verify and export accounts.
+        rebuild (bool): If True, the cache is dropped and every file is parsed again.
+    Returns:
+        set: The account numbers whose reports were regenerated.
+    """
+    message_dir, output_dir = config['message_dir'], config['output_dir']
+    cache = TransactionCache(output_dir, config, rebuild=rebuild)
+    try:
+        cached_digests = cache.digests()
+        file_names = list_message_files(message_dir)
+        digests = {name: file_digest(os.path.join(message_dir, name)) for name in file_names}
+        changed = [name for name in file_names if cached_digests.get(name) != digests[name]]
+        removed = [name for name in cached_digests if name not in digests]
+
+        affected_accounts = set()
+        per_file = {}
+        for name in changed + removed:
+            entry = cache.load(name)
+            if entry is not None:
+                affected_accounts.update(transaction['account_number'] for transaction in entry[0])
+        for name in file_names:
+            if name not in changed:
+                per_file[name] = cache.load(name)[0]
+
+        results = parse_message_files([os.path.join(message_dir, name) for name in changed],
+                                      config['initial_year'], config['keywords'], workers,
+                                      errors=config.get('decode_errors', 'replace'))
+        for name, (transactions, state) in zip(changed, results):
+            per_file[name] = transactions
+            affected_accounts.update(transaction['account_number'] for transaction in transactions)
+            cache.store(name, digests[name], transactions, state)
+        for name in removed:
+            cache.remove(name)
+
+        rules = dedup_rules(config)
+        if rules:
+            transactions = deduplicate_transactions([per_file[name] for name in file_names], file_names, rules)
+        else:
+            transactions = merge_transactions(per_file[name] for name in file_names)
+        present_accounts = {transaction['account_number'] for transaction in transactions}
+        # Unchanged accounts are exported again if any configured sink lacks them; accounts whose
+        # transactions all came from removed files are deleted from every sink.
+        sinks = open_sinks(config)
+        try:
+            for account_number in present_accounts - affected_accounts:
+                if not all(sink.has_account(account_number) for sink in sinks):
+                    affected_accounts.add(account_number)
+            for account_number in affected_accounts - present_accounts:
+                logger.warning(f"Account {account_number} has no transactions left, removing its output")
+                for sink in sinks:
+                    sink.remove(account_number)
+                remove_file(os.path.join(output_dir, f'{account_number}.png'))
+        finally:
+            close_sinks(sinks)
+
+        transactions = [transaction for transaction in transactions
+                        if transaction['account_number'] in affected_accounts]
+        if transactions:
+            verify_and_export(transactions, config, workers=workers)
+            export_charts(transactions, config, workers=workers)
+        cache.commit()
+    finally:
+        cache.close()
+
+    logger.info(f"Incremental run: {len(changed)} changed and {len(removed)} removed files, "
+                f"{len(affected_accounts & present_accounts)} accounts re-exported")
+    return affected_accounts & present_accounts
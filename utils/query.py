@@ -0,0 +1,107 @@
+# query.py
+
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from utils.parsers import FIELDS
+
+
+# Written by the sqlite sink (utils.sinks.SqliteSink) into output_dir.
+INDEX_FILE = 'transactions.sqlite3'
+# Accepted period lengths and their formats.
+PERIOD_FORMATS = {4: '%Y', 7: '%Y-%m', 10: '%Y-%m-%d'}
+
+
+def index_path(output_dir):
+    return os.path.join(output_dir, INDEX_FILE)
+
+
+def period_bounds(period):
+    """
+    Expands a year, month or day ('2019', '2019-01', '2019-01-15') to its first and last ISO date.
+    Dates are stored as 'YYYY-MM-DD' text, so the bounds compare correctly as strings.
+    Raises:
+        ValueError: If the period is not in one of those forms.
+    """
+    try:
+        datetime.strptime(period, PERIOD_FORMATS[len(period)])
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid period {period!r}, use YYYY, YYYY-MM or YYYY-MM-DD") from None
+    if len(period) == 4:
+        return f'{period}-01-01', f'{period}-12-31'
+    if len(period) == 7:
+        return f'{period}-01', f'{period}-31'
+    return period, period
+
+
+def build_query(account=None, date_from=None, date_to=None, counterparty=None, bank=None,
+                transaction_type=None, min_amount=None, max_amount=None, limit=None):
+    """
+    Translates the filters into one SQL statement over the sqlite sink's table. Every filter maps to
+    an indexed column, so SQLite can start from the most selective index instead of scanning.
+    Returns:
+        tuple: (sql, parameters)
+    """
+    conditions, parameters = [], []
+    if account is not None:
+        conditions.append('account_number = ?')
+        parameters.append(str(account))
+    if date_from is not None:
+        conditions.append('date >= ?')
+        parameters.append(period_bounds(date_from)[0])
+    if date_to is not None:
+        conditions.append('date <= ?')
+        parameters.append(period_bounds(date_to)[1])
+    if counterparty is not None:
+        # Exact matches use the object1/object2 indexes; '*' and '?' make it a glob pattern.
+        operator = 'GLOB' if any(char in counterparty for char in '*?[') else '='
+        conditions.append(f'(object1 {operator} ? OR object2 {operator} ?)')
+        parameters.extend([counterparty, counterparty])
+    if bank is not None:
+        conditions.append('bank_name = ?')
+        parameters.append(bank)
+    if transaction_type is not None:
+        conditions.append('type = ?')
+        parameters.append(transaction_type)
+    # Outgoing amounts are stored negative, the amount filters apply to the absolute value.
+    if min_amount is not None:
+        conditions.append('ABS(amount) >= ?')
+        parameters.append(float(min_amount))
+    if max_amount is not None:
+        conditions.append('ABS(amount) <= ?')
+        parameters.append(float(max_amount))
+
+    sql = f"SELECT {', '.join(FIELDS)} FROM transactions"
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY date, account_number, seq'
+    if limit is not None:
+        sql += ' LIMIT ?'
+        parameters.append(int(limit))
+    return sql, parameters
+
+
+def query_transactions(path, **filters):
+    """
+    Looks transactions up in the persisted index written by the sqlite sink, without running the pipeline.
+    Args:
+        path (str): The index database, see index_path.
+        filters: account, date_from, date_to (YYYY, YYYY-MM or YYYY-MM-DD, inclusive), counterparty
+            (exact object1/object2, or a glob such as '*陈晓明*'), bank, transaction_type
+            ('income' or 'outcome'), min_amount, max_amount (absolute amounts) and limit.
+    Returns:
+        list: The matching transactions as dicts in FIELDS order, by date then account.
+    Raises:
+        FileNotFoundError: If the index has not been written yet.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No transaction index at {path}, add 'sqlite' to sinks in config.yaml and run main.py")
+    sql, parameters = build_query(**filters)
+    connection = sqlite3.connect(Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        cursor = connection.execute(sql, parameters)
+        return [dict(zip(FIELDS, row)) for row in cursor]
+    finally:
+        connection.close()
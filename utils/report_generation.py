@@ -1,26 +1,54 @@
 import csv
 import os
-from utils.util import log_execution, setup_logger, is_number
-from collections import defaultdict
-import matplotlib.pyplot as plt
-from datetime import datetime
-import numpy as np
-import seaborn as sns
-import openpyxl
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from types import SimpleNamespace
+from utils.util import log_execution, setup_logger, is_number, group_by_account
+from utils.parsers import export_values
 
 logger = setup_logger()
-thin_border = openpyxl.styles.borders.Border(left=openpyxl.styles.borders.Side(border_style='thin'),
-                                             right=openpyxl.styles.borders.Side(border_style='thin'),
-                                             top=openpyxl.styles.borders.Side(border_style='thin'),
-                                             bottom=openpyxl.styles.borders.Side(border_style='thin'))
-Font = openpyxl.styles.Font(u'微软雅黑', size=12, bold=False, italic=False, strike=False, color='000000')
-ErrorFont = openpyxl.styles.Font(u'微软雅黑', size=11, bold=True, italic=False, strike=False, color='FF0000')
-RightFont = openpyxl.styles.Font(u'微软雅黑', size=11, bold=True, italic=False, strike=False, color='008000')
-Align = openpyxl.styles.Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+
+@lru_cache(maxsize=None)
+def xlsx_styles():
+    """
+    Imports openpyxl and builds the shared style objects on first use, so importing this
+    module (e.g. for a parse-and-verify-only run) does not pay for openpyxl.
+    Returns:
+        SimpleNamespace: thin_border, Font, ErrorFont, RightFont, Align and HeaderFill.
+    """
+    import openpyxl
+    return SimpleNamespace(
+        thin_border=openpyxl.styles.borders.Border(left=openpyxl.styles.borders.Side(border_style='thin'),
+                                                   right=openpyxl.styles.borders.Side(border_style='thin'),
+                                                   top=openpyxl.styles.borders.Side(border_style='thin'),
+                                                   bottom=openpyxl.styles.borders.Side(border_style='thin')),
+        Font=openpyxl.styles.Font(u'微软雅黑', size=12, bold=False, italic=False, strike=False, color='000000'),
+        ErrorFont=openpyxl.styles.Font(u'微软雅黑', size=11, bold=True, italic=False, strike=False, color='FF0000'),
+        RightFont=openpyxl.styles.Font(u'微软雅黑', size=11, bold=True, italic=False, strike=False, color='008000'),
+        Align=openpyxl.styles.Alignment(horizontal='center', vertical='center', wrap_text=True),
+        HeaderFill=openpyxl.styles.PatternFill(start_color='ffeb9c', end_color='ffeb9c', fill_type='solid'),
+    )
+
+
+STYLE_NAMES = {'thin_border', 'Font', 'ErrorFont', 'RightFont', 'Align', 'HeaderFill'}
+
+
+def __getattr__(name):
+    # Keeps `from utils.report_generation import thin_border` (and friends) working.
+    if name in STYLE_NAMES:
+        return getattr(xlsx_styles(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+HEADERS = ['日期', '转出方', "接收方", "我方账号", "收入/支出", "金额", "余额", "银行名称", "局部预期余额计算", "差额(同前向)", "全局预期余额计算"]
+HEADER_LENS = [14, 36, 18, 12, 13, 12, 12, 14, 34, 14, 18]
+NOTE_COL, GAP_COL = 8, 9
 
 
 @log_execution(verbose=False)
-def generate_csv_files(transactions, output_dir):
+def generate_csv_files(transactions, output_dir, mode='standard', workers=1):
     """
     Generates CSV files for transactions, grouped by account number.
     Each account's transactions are written to a separate CSV file.
@@ -28,46 +56,171 @@ def generate_csv_files(transactions, output_dir):
     Args:
         transactions (list): The list of transaction details.p
         output_dir (str): The directory where the CSV files will be saved.
+        mode (str): 'standard' styles every cell of a regular workbook, 'fast' streams
+            write-only workbooks with shared named styles (see write_account_xlsx).
+        workers (int): In 'fast' mode, the number of processes writing accounts in parallel.
+    """
+    transactions_by_account = group_by_account(transactions)
+
+    write_xlsx_reports(transactions_by_account, output_dir, mode=mode, workers=workers)
+
+
+def write_xlsx_reports(transactions_by_account, output_dir, mode='standard', workers=1):
     """
-    transactions_by_account = defaultdict(list)
-    
-    for transaction in transactions:
-        account_number = transaction['account_number']
-        transactions_by_account[account_number].append(transaction)
-
-    for account_number, account_transactions in transactions_by_account.items():
-        file_path = os.path.join(output_dir, f'账户{account_number}.xlsx')
-        try:
-            wb = openpyxl.Workbook()
-            sheet = wb.active
-            headers = ['日期', '转出方', "接收方", "我方账号", "收入/支出", "金额", "余额", "银行名称", "局部预期余额计算", "差额(同前向)", "全局预期余额计算"]
-            header_lens = [14, 36, 18, 12, 13, 12, 12, 14, 34, 14, 18]
-            sheet.freeze_panes = 'A2'
-            sheet.append(headers)
-
-            for i, header in enumerate(headers, start=1):
-                col_letter = openpyxl.utils.get_column_letter(i)
-                cell = sheet.cell(row=1, column=i)
-                cell.font = openpyxl.styles.Font(size=12, bold=True)
-                cell.border = thin_border
-                cell.alignment = Align
-                
-                cell.fill = openpyxl.styles.PatternFill(start_color='ffeb9c', end_color='ffeb9c', fill_type='solid')
-                header_length = max(header_lens[i-1], 8)  # Minimum width of 10 characters
-                sheet.column_dimensions[col_letter].width = header_length
-
-            for idx, transaction in enumerate(account_transactions, start=2):
-                row = list(transaction.values())
-                row = [float(item) if is_number(item) else item for item in row]
-                sheet.append(row)
-                style_transaction_cell(sheet, idx, row)
-
-            wb.save(file_path)
-
-        except IOError as e:
-            logger.error(f"IO error occurred while writing to {file_path}: {e}")
-        except Exception as e:
-            logger.error(f"An unexpected error occurred: {e}")
+    Writes one .xlsx report per account.
+
+    Args:
+        transactions_by_account (dict): account number -> the account's transaction details.
+        output_dir (str): The directory where the reports will be saved.
+        mode (str): 'standard' or 'fast', see generate_csv_files.
+        workers (int): In 'fast' mode, the number of processes writing accounts in parallel.
+    """
+    if mode == 'fast':
+        writer = write_account_xlsx
+    elif mode == 'standard':
+        writer = write_account_xlsx_standard
+    else:
+        raise ValueError(f"Unknown report mode: {mode}")
+
+    accounts = list(transactions_by_account.items())
+    if mode == 'fast' and workers > 1 and len(accounts) > 1:
+        # Largest accounts first, so the last worker is not left with the biggest file.
+        accounts.sort(key=lambda item: len(item[1]), reverse=True)
+        with ProcessPoolExecutor(max_workers=min(workers, len(accounts))) as pool:
+            list(pool.map(writer, [account for account, _ in accounts],
+                          [rows for _, rows in accounts], repeat(output_dir)))
+    else:
+        for account_number, account_transactions in accounts:
+            writer(account_number, account_transactions, output_dir)
+
+
+def write_account_xlsx_standard(account_number, account_transactions, output_dir):
+    """
+    Writes one account's report with a regular workbook, styling it cell by cell.
+
+    Args:
+        account_number (str): The account the transactions belong to.
+        account_transactions (list): The account's transaction details, in report order.
+        output_dir (str): The directory where the report will be saved.
+    """
+    import openpyxl
+    styles = xlsx_styles()
+    file_path = os.path.join(output_dir, f'账户{account_number}.xlsx')
+    try:
+        wb = openpyxl.Workbook()
+        sheet = wb.active
+        headers = HEADERS
+        header_lens = HEADER_LENS
+        sheet.freeze_panes = 'A2'
+        sheet.append(headers)
+
+        for i, header in enumerate(headers, start=1):
+            col_letter = openpyxl.utils.get_column_letter(i)
+            cell = sheet.cell(row=1, column=i)
+            cell.font = openpyxl.styles.Font(size=12, bold=True)
+            cell.border = styles.thin_border
+            cell.alignment = styles.Align
+            
+            cell.fill = openpyxl.styles.PatternFill(start_color='ffeb9c', end_color='ffeb9c', fill_type='solid')
+            header_length = max(header_lens[i-1], 8)  # Minimum width of 10 characters
+            sheet.column_dimensions[col_letter].width = header_length
+
+        for idx, transaction in enumerate(account_transactions, start=2):
+            row = export_values(transaction)
+            row = [float(item) if is_number(item) else item for item in row]
+            sheet.append(row)
+            style_transaction_cell(sheet, idx, row)
+
+        wb.save(file_path)
+
+    except IOError as e:
+        logger.error(f"IO error occurred while writing to {file_path}: {e}")
+    except Exception as e:
+        logger.error(f"An unexpected error occurred: {e}")
+
+
+def make_named_styles():
+    """
+    Builds the named styles used by the fast writer; NamedStyle objects bind to a single workbook,
+    so every workbook gets its own set.
+    Returns:
+        dict: style key -> NamedStyle
+    """
+    import openpyxl
+    styles = xlsx_styles()
+    NamedStyle = openpyxl.styles.NamedStyle
+    return {
+        'header': NamedStyle(name='txn_header', font=openpyxl.styles.Font(size=12, bold=True),
+                             border=styles.thin_border, alignment=styles.Align, fill=styles.HeaderFill),
+        'plain': NamedStyle(name='txn_plain', font=openpyxl.styles.fonts.DEFAULT_FONT,
+                            border=styles.thin_border, alignment=styles.Align),
+        'error': NamedStyle(name='txn_error', font=styles.ErrorFont, border=styles.thin_border, alignment=styles.Align),
+        'right': NamedStyle(name='txn_right', font=styles.RightFont, border=styles.thin_border, alignment=styles.Align),
+    }
+
+
+def to_cell_value(item):
+    """
+    Same conversion as the standard writer: numeric strings become floats.
+    """
+    return float(item) if is_number(item) else item
+
+
+def write_account_xlsx(account_number, account_transactions, output_dir):
+    """
+    Writes one account's report with a write-only (streaming) workbook.
+    Rows are serialised as soon as they are appended, so memory does not grow with the row count.
+    Every column owns one pre-styled cell per named style, and each row only swaps in values,
+    instead of assigning border, alignment and font objects cell by cell.
+
+    Args:
+        account_number (str): The account the transactions belong to.
+        account_transactions (list): The account's transaction details, in report order.
+        output_dir (str): The directory where the report will be saved.
+    """
+    import openpyxl
+    file_path = os.path.join(output_dir, f'账户{account_number}.xlsx')
+    try:
+        wb = openpyxl.Workbook(write_only=True)
+        sheet = wb.create_sheet('Sheet')
+        styles = make_named_styles()
+        for style in styles.values():
+            wb.add_named_style(style)
+
+        sheet.freeze_panes = 'A2'
+        for i, header_length in enumerate(HEADER_LENS, start=1):
+            sheet.column_dimensions[openpyxl.utils.get_column_letter(i)].width = max(header_length, 8)
+
+        def styled_cell(style, value=None):
+            cell = openpyxl.cell.WriteOnlyCell(sheet, value=value)
+            cell.style = styles[style].name
+            return cell
+
+        sheet.append([styled_cell('header', header) for header in HEADERS])
+        plain = [styled_cell('plain') for _ in HEADERS]
+        note_error = styled_cell('error')
+        gap_error, gap_right = styled_cell('error'), styled_cell('right')
+
+        for transaction in account_transactions:
+            row = [to_cell_value(item) for item in export_values(transaction)]
+            cells = plain[:]
+            for cell, value in zip(cells, row):
+                cell.value = value
+            note, gap = row[NOTE_COL], row[GAP_COL]
+            if note != '' and '没有余额' not in note:
+                note_error.value = note
+                cells[NOTE_COL] = note_error
+            if gap != '':
+                cells[GAP_COL] = gap_error if gap < 0 else gap_right
+                cells[GAP_COL].value = gap
+            sheet.append(cells)
+
+        wb.save(file_path)
+
+    except IOError as e:
+        logger.error(f"IO error occurred while writing to {file_path}: {e}")
+    except Exception as e:
+        logger.error(f"An unexpected error occurred: {e}")
 
 
 def style_transaction_cell(sheet, row, row_value):
@@ -76,108 +229,32 @@ def style_transaction_cell(sheet, row, row_value):
     if the gap rol is not '', make font red when <0, green when >0
     if the note rol is not '', make font red.
     """
+    styles = xlsx_styles()
     map_idx_to_col = {'date': 0, 'object1': 1, 'object2': 2, 'account_number': 3, 'type': 4,
                       'amount': 5, 'balance': 6, 'bank_name': 7, 'note': 8, 'gap': 9, 'running_balance': 10}
     cell = sheet.cell(row=row, column=1)
 
     for col_idx, col_value in enumerate(row_value, start=0):
         cell = sheet.cell(row=row, column=col_idx+1)
-        cell.border = thin_border
-        cell.alignment = Align
+        cell.border = styles.thin_border
+        cell.alignment = styles.Align
         if col_idx == map_idx_to_col['gap']:
             if col_value == '':
                 continue
             elif col_value < 0:
                 # cell.fill = openpyxl.styles.PatternFill(start_color='ffcccc', end_color='ffcccc', fill_type='solid')
-                cell.font = ErrorFont
+                cell.font = styles.ErrorFont
 
             else:
                 # cell.fill = openpyxl.styles.PatternFill(start_color='ccffcc', end_color='ccffcc', fill_type='solid')
-                cell.font = RightFont
+                cell.font = styles.RightFont
         elif col_idx == map_idx_to_col['note']:
             if col_value == '' or '没有余额' in col_value:
                 continue
             else:
                 # cell.fill = openpyxl.styles.PatternFill(start_color='ffcccc', end_color='ffcccc', fill_type='solid')
-                cell.font = ErrorFont
+                cell.font = styles.ErrorFont
         else:
             continue
 
     return
-
-
-@log_execution(verbose=False)
-def calculate_monthly_totals(transactions):
-    """Calculate monthly totals for income and outcome, grouped by account number."""
-    monthly_totals = defaultdict(lambda: defaultdict(lambda: {'income': 0, 'outcome': 0}))
-
-    for transaction in transactions:
-        date = datetime.strptime(transaction['date'], '%Y-%m-%d')
-        amount = float(transaction['amount'])  # Convert to float or int
-        account_number = transaction['account_number']
-
-        if amount > 0:
-            monthly_totals[account_number][date.strftime('%Y-%m')]['income'] += amount
-        else:
-            monthly_totals[account_number][date.strftime('%Y-%m')]['outcome'] += abs(amount)
-
-    return monthly_totals
-
-
-# Setting Seaborn style
-sns.set(style="whitegrid")
-
-
-@log_execution(verbose=False)
-def plot_monthly_totals(monthly_totals, output_dir):
-    """Plot the monthly totals as side-by-side bar charts with improved styling."""
-    for account, months in monthly_totals.items():
-        fig, ax = plt.subplots()
-        months_sorted = sorted(months.keys())
-        incomes = [months[month]['income'] for month in months_sorted]
-        outcomes = [months[month]['outcome'] for month in months_sorted]
-
-        bar_width = 0.35
-        index = np.arange(len(months_sorted))
-
-        bar1 = ax.bar(index, incomes, bar_width, label='Income', color='skyblue')
-        bar2 = ax.bar(index + bar_width, outcomes, bar_width, label='Outcome', color='salmon')
-
-        ax.set_xlabel('Month', fontsize=10, fontweight='bold')
-        ax.set_ylabel('Amount', fontsize=12, fontweight='bold')
-        ax.set_title(f'Monthly Income and Outcome Comparison for Account {account}', fontsize=14, fontweight='bold')
-
-        month_labels = [month[:4] + '-' + month[5:] if i != 0 else month for i, month in enumerate(months_sorted)]
-        ax.set_xticks(index + bar_width / 2)
-        ax.set_xticklabels(month_labels, rotation=0, fontsize=10, ha='center')
-
-        # Add padding to X- and Y-axes
-        ax.set_ylim(0, max(incomes + outcomes) * 1.1)  # 10% padding above the max value
-        ax.margins(x=0.1)  # 5% padding for the x-axis
-
-        ax.legend()
-
-        # Adding grid lines
-        ax.yaxis.grid(True)
-
-        def autolabel(bars):
-            """Attach a text label above each bar in *bars*, displaying its height."""
-            for bar in bars:
-                height = bar.get_height()
-                ax.annotate('{}'.format(round(height, 2)),
-                            xy=(bar.get_x() + bar.get_width() / 2, height),
-                            xytext=(0, 3),  # 3 points vertical offset
-                            textcoords="offset points",
-                            ha='center', va='bottom', fontsize=9)
-
-        autolabel(bar1)
-        autolabel(bar2)
-
-        plt.tight_layout()
-        # plt.show()
-
-        # save the plot
-        file_name = f'{account}.png'
-        file_path = os.path.join(output_dir, file_name)
-        plt.savefig(file_path, dpi=300)
-        plt.close()
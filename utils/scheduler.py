@@ -0,0 +1,98 @@
+# scheduler.py
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from utils.util import log_execution, setup_logger, group_by_account
+from utils.metrics import get_stage_metrics, merge_stage_metrics, reset_metrics
+from utils.data_verification import verify_transactions
+from utils.sinks import SINKS, sink_names, open_sinks, close_sinks
+
+
+logger = setup_logger()
+
+
+def verify_and_write_account(account_number, account_transactions, config, names, return_verified=False):
+    """
+    Verifies one account and writes it to the given sinks. Runs in a worker process: accounts are
+    independent once grouped, so every account is a task of its own.
+    Args:
+        account_number (str): The account the transactions belong to.
+        account_transactions (list): The account's transactions, in date order.
+        config (dict): The configuration parameters read from config.yaml.
+        names (list): The sinks to write to in this process.
+        return_verified (bool): Send the verified transactions back, for sinks the parent writes.
+    Returns:
+        tuple: (account number, transaction count, verified transactions or None, stage metrics
+            recorded by the task)
+    """
+    reset_metrics()
+    verified = verify_transactions(account_transactions, threshold=config['threshold'])
+    sinks = open_sinks(config, names)
+    try:
+        for sink in sinks:
+            sink.write(account_number, verified)
+    finally:
+        close_sinks(sinks)
+    return account_number, len(verified), verified if return_verified else None, get_stage_metrics()
+
+
+@log_execution(verbose=False)
+def verify_and_export(transactions, config, workers=1, max_pending=None):
+    """
+    Groups the transactions by account once, then verifies and exports every account as an
+    independent task. With several workers the accounts are dispatched to a process pool, largest
+    first so the biggest account does not end up last on one core, and at most max_pending accounts
+    are in flight, which caps the copies held by the pool. Sinks that are not parallel-safe (sqlite)
+    are written by this process as the verified accounts come back.
+    Args:
+        transactions (list): The transaction details, in date order.
+        config (dict): The configuration parameters read from config.yaml.
+        workers (int): The number of processes; 1 runs every account in this process.
+        max_pending (int, optional): Accounts submitted but not finished; defaults to twice the workers.
+    Returns:
+        dict: account number -> number of transactions exported.
+    """
+    transactions_by_account = group_by_account(transactions)
+    names = sink_names(config)
+    exported = {}
+
+    if workers <= 1 or len(transactions_by_account) <= 1:
+        sinks = open_sinks(config, names)
+        try:
+            for account_number, account_transactions in transactions_by_account.items():
+                verified = verify_transactions(account_transactions, threshold=config['threshold'])
+                for sink in sinks:
+                    sink.write(account_number, verified)
+                exported[account_number] = len(verified)
+        finally:
+            close_sinks(sinks)
+        logger.info(f"Verified and exported {len(exported)} accounts")
+        return exported
+
+    worker_names = [name for name in names if SINKS[name].parallel_safe]
+    parent_names = [name for name in names if not SINKS[name].parallel_safe]
+    max_pending = max_pending or 2 * workers
+    accounts = sorted(transactions_by_account.items(), key=lambda item: len(item[1]), reverse=True)
+    queue = iter(accounts)
+    sinks = open_sinks(config, parent_names)
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(accounts))) as pool:
+            pending = set()
+            while True:
+                for account_number, account_transactions in queue:
+                    pending.add(pool.submit(verify_and_write_account, account_number, account_transactions,
+                                            config, worker_names, bool(parent_names)))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    account_number, count, verified, task_metrics = future.result()
+                    merge_stage_metrics(task_metrics)
+                    for sink in sinks:
+                        sink.write(account_number, verified)
+                    exported[account_number] = count
+    finally:
+        close_sinks(sinks)
+    logger.info(f"Verified and exported {len(exported)} accounts on {workers} workers")
+    return exported
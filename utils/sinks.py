@@ -0,0 +1,245 @@
+# sinks.py
+
+import csv
+import os
+import sqlite3
+from utils.util import setup_logger, is_number, format_date_key
+from utils.report_generation import write_xlsx_reports
+from utils.parsers import FIELDS
+
+
+logger = setup_logger()
+
+# Columns written as numbers by the machine-readable sinks; '' becomes NULL.
+NUMERIC_FIELDS = {'amount', 'balance', 'gap', 'running_balance'}
+
+# Indexes of the sqlite sink's table, which double as the query index of utils.query.
+SQLITE_INDEXES = {
+    'transactions_account_date': '(account_number, date)',
+    'transactions_date': '(date)',
+    'transactions_object1': '(object1)',
+    'transactions_object2': '(object2)',
+    'transactions_bank_date': '(bank_name, date)',
+    'transactions_abs_amount': '(ABS(amount))',
+}
+
+
+def typed_row(transaction):
+    """
+    Converts a transaction dict to a tuple in FIELDS order, with numeric columns as float or None
+    and the date key as 'YYYY-MM-DD'.
+    """
+    return (format_date_key(transaction['date']),) + tuple(
+        (float(transaction[field]) if is_number(transaction[field]) else None)
+        if field in NUMERIC_FIELDS else transaction[field]
+        for field in FIELDS[1:]
+    )
+
+
+class Sink:
+    """
+    An output format. Accounts are handed over one at a time, so a sink never needs the whole archive.
+    Sinks writing one file per account are parallel-safe: worker processes may write different
+    accounts through their own instances at the same time.
+    """
+    parallel_safe = True
+
+    def __init__(self, output_dir, config):
+        self.output_dir = output_dir
+        self.config = config
+
+    def write(self, account_number, account_transactions):
+        raise NotImplementedError
+
+    def write_accounts(self, transactions_by_account, workers=1):
+        for account_number, account_transactions in transactions_by_account.items():
+            self.write(account_number, account_transactions)
+
+    def has_account(self, account_number):
+        """
+        Tells whether the sink already holds output for an account, so a cached run knows which
+        unchanged accounts still have to be exported (e.g. after a sink was added).
+        """
+        raise NotImplementedError
+
+    def remove(self, account_number):
+        """
+        Deletes the output of an account that has no transactions left (its message file was removed).
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def remove_file(file_path):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+class XlsxSink(Sink):
+    """
+    The styled per-account .xlsx reports, see utils.report_generation.
+    """
+
+    def write(self, account_number, account_transactions):
+        self.write_accounts({account_number: account_transactions})
+
+    def write_accounts(self, transactions_by_account, workers=1):
+        write_xlsx_reports(transactions_by_account, self.output_dir,
+                           mode=self.config.get('report_mode', 'standard'), workers=workers)
+
+    def has_account(self, account_number):
+        return os.path.exists(os.path.join(self.output_dir, f'账户{account_number}.xlsx'))
+
+    def remove(self, account_number):
+        remove_file(os.path.join(self.output_dir, f'账户{account_number}.xlsx'))
+
+
+class CsvSink(Sink):
+    """
+    One plain CSV per account (账户<account>.csv), written row by row with a FIELDS header.
+    Encoded as UTF-8 with a BOM so spreadsheet applications pick up the Chinese text.
+    """
+
+    def write(self, account_number, account_transactions):
+        file_path = os.path.join(self.output_dir, f'账户{account_number}.csv')
+        try:
+            with open(file_path, 'w', encoding='utf-8-sig', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(FIELDS)
+                for transaction in account_transactions:
+                    writer.writerow(typed_row(transaction))
+        except IOError as e:
+            logger.error(f"IO error occurred while writing to {file_path}: {e}")
+
+    def has_account(self, account_number):
+        return os.path.exists(os.path.join(self.output_dir, f'账户{account_number}.csv'))
+
+    def remove(self, account_number):
+        remove_file(os.path.join(self.output_dir, f'账户{account_number}.csv'))
+
+
+class SqliteSink(Sink):
+    """
+    All accounts in one 'transactions' table of transactions.sqlite3, indexed by account, date,
+    counterparty, bank and absolute amount (see SQLITE_INDEXES) for utils.query.
+    Writing an account replaces its previous rows, so incremental runs stay consistent.
+    Not parallel-safe: all accounts go through the one connection of the main process.
+    """
+    parallel_safe = False
+
+    def __init__(self, output_dir, config):
+        super().__init__(output_dir, config)
+        self.connection = sqlite3.connect(os.path.join(output_dir, 'transactions.sqlite3'))
+        columns = ', '.join(f"{field} {'REAL' if field in NUMERIC_FIELDS else 'TEXT'}" for field in FIELDS)
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS transactions (seq INTEGER, {columns})')
+        for name, columns in SQLITE_INDEXES.items():
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS {name} ON transactions {columns}')
+
+    def write(self, account_number, account_transactions):
+        placeholders = ', '.join('?' * (len(FIELDS) + 1))
+        with self.connection:
+            self.connection.execute('DELETE FROM transactions WHERE account_number = ?', (account_number,))
+            self.connection.executemany(
+                f'INSERT INTO transactions VALUES ({placeholders})',
+                ((seq,) + typed_row(transaction) for seq, transaction in enumerate(account_transactions)),
+            )
+
+    def has_account(self, account_number):
+        row = self.connection.execute('SELECT 1 FROM transactions WHERE account_number = ? LIMIT 1',
+                                      (account_number,)).fetchone()
+        return row is not None
+
+    def remove(self, account_number):
+        with self.connection:
+            self.connection.execute('DELETE FROM transactions WHERE account_number = ?', (account_number,))
+
+    def close(self):
+        # Refreshes the planner statistics, so queries pick the most selective index.
+        self.connection.execute('PRAGMA optimize')
+        self.connection.close()
+
+
+class ParquetSink(Sink):
+    """
+    One Parquet file per account (账户<account>.parquet). Needs pyarrow; without it the sink
+    logs an error once and writes nothing.
+    """
+
+    def __init__(self, output_dir, config):
+        super().__init__(output_dir, config)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            logger.error("The parquet sink needs pyarrow (pip install pyarrow), skipping it")
+            self.pyarrow = None
+        else:
+            self.pyarrow = pyarrow
+
+    def write(self, account_number, account_transactions):
+        if self.pyarrow is None:
+            return
+        pa = self.pyarrow
+        rows = [typed_row(transaction) for transaction in account_transactions]
+        columns = {
+            field: pa.array([row[i] for row in rows], type=pa.float64() if field in NUMERIC_FIELDS else pa.string())
+            for i, field in enumerate(FIELDS)
+        }
+        file_path = os.path.join(self.output_dir, f'账户{account_number}.parquet')
+        try:
+            pa.parquet.write_table(pa.table(columns), file_path)
+        except (IOError, pa.ArrowException) as e:
+            logger.error(f"Error occurred while writing to {file_path}: {e}")
+
+    def has_account(self, account_number):
+        # Without pyarrow nothing is ever written, re-exporting would not change that.
+        return self.pyarrow is None or os.path.exists(os.path.join(self.output_dir, f'账户{account_number}.parquet'))
+
+    def remove(self, account_number):
+        remove_file(os.path.join(self.output_dir, f'账户{account_number}.parquet'))
+
+
+SINKS = {
+    'xlsx': XlsxSink,
+    'csv': CsvSink,
+    'sqlite': SqliteSink,
+    'parquet': ParquetSink,
+}
+
+
+def sink_names(config):
+    """
+    Returns:
+        list: The sink names listed under 'sinks' in config.yaml (default: xlsx only).
+    Raises:
+        ValueError: If an unknown sink name is configured.
+    """
+    names = config.get('sinks') or ['xlsx']
+    unknown = [name for name in names if name not in SINKS]
+    if unknown:
+        raise ValueError(f"Unknown sinks {unknown}, choose from {list(SINKS)}")
+    return names
+
+
+def open_sinks(config, names=None):
+    """
+    Instantiates the sinks listed under 'sinks' in config.yaml (default: xlsx only).
+    Args:
+        config (dict): The configuration parameters read from config.yaml.
+        names (list, optional): Open these sinks instead of the configured ones.
+    Returns:
+        list: The sink instances; close them with close_sinks.
+    Raises:
+        ValueError: If an unknown sink name is configured.
+    """
+    names = sink_names(config) if names is None else names
+    return [SINKS[name](config['output_dir'], config) for name in names]
+
+
+def close_sinks(sinks):
+    for sink in sinks:
+        sink.close()
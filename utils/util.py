@@ -1,9 +1,10 @@
 import os
-from functools import wraps
-import time
+from collections import defaultdict
+from functools import lru_cache, wraps
 from datetime import datetime
 import logging
 from logging.handlers import RotatingFileHandler
+from utils.metrics import stage, count_items
 
 
 def parse_date(date_str, current_year):
@@ -24,6 +25,34 @@ def parse_date(date_str, current_year):
     raise ValueError('Invalid date format')
 
 
+@lru_cache(maxsize=None)
+def parse_date_key(date_str, current_year):
+    """
+    Parses a message date ('01月22日') into the integer key yyyymmdd that transactions carry as 'date'.
+    Memoised: an archive only spans a few thousand distinct days, so strptime runs once per day
+    instead of once per message and stage.
+    Args:
+        date_str (str): The date string to parse.
+        current_year (int): The current year to use for parsing the date.
+    Returns:
+        int: The date as yyyymmdd, e.g. 20190122.
+    Raises:
+        ValueError: If the date format is invalid.
+    """
+    date = parse_date(date_str, current_year)
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+@lru_cache(maxsize=None)
+def format_date_key(key):
+    """
+    Formats a yyyymmdd date key as 'YYYY-MM-DD' for export; strings are returned unchanged.
+    """
+    if isinstance(key, str):
+        return key
+    return f"{key // 10000:04d}-{key // 100 % 100:02d}-{key % 100:02d}"
+
+
 # def setup_logger():
 #     logging.basicConfig(
 #         level=logging.INFO,
@@ -43,6 +72,9 @@ def setup_logger():
     # create a logger with the name of the module
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
+    # Every module calls setup_logger(), only attach the file handler once.
+    if logger.handlers:
+        return logger
 
     # create a file handler that logs messages to a file with rotation
     log_dir = 'logs'
@@ -71,6 +103,8 @@ logger = setup_logger()
 def log_execution(verbose=False):
     """
     Decorator for logging the execution time of a function.
+    Every call is also recorded as a pipeline stage in utils.metrics (wall and CPU time, peak memory
+    while tracemalloc runs, and the lengths of the first argument and the result as items in/out).
     Args:
         verbose (bool): If True, the execution time is logged. Defaults to False.
     Returns:
@@ -79,16 +113,30 @@ def log_execution(verbose=False):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
-            result = func(*args, **kwargs)
-            end_time = time.time()
+            with stage(func.__name__, count_items(args[0]) if args else None) as record:
+                result = func(*args, **kwargs)
+                record['items_out'] = count_items(result)
             if verbose:
-                logger.info(f"Executed {func.__name__} in {end_time - start_time:.4f} seconds")
+                logger.info(f"Executed {func.__name__} in {record['wall']:.4f} seconds")
             return result
         return wrapper
     return decorator
 
 
+def group_by_account(transactions):
+    """
+    Groups transactions by account number, the one grouping step shared by verification and export.
+    Args:
+        transactions (iterable): The transaction details.
+    Returns:
+        dict: account number -> the account's transactions in input order, accounts in first-seen order.
+    """
+    transactions_by_account = defaultdict(list)
+    for transaction in transactions:
+        transactions_by_account[transaction['account_number']].append(transaction)
+    return transactions_by_account
+
+
 def is_number(s):
     try:
         float(s)
@@ -0,0 +1,216 @@
+# watch.py
+
+import os
+import time
+from bisect import insort
+from collections import defaultdict
+from utils.util import setup_logger
+from utils.data_extraction import (list_message_files, iter_year_messages, sort_file_messages,
+                                   iter_extract_messages, iter_extract_details)
+from utils.data_verification import verify_account
+from utils.bulk_reader import SAMPLE_SIZE, detect_encoding, find_line_end, iter_buffer_lines
+from utils.sinks import open_sinks, close_sinks
+
+
+logger = setup_logger()
+
+INOTIFY_EVENTS = ('CREATE', 'MODIFY', 'CLOSE_WRITE', 'MOVED_TO', 'MOVED_FROM', 'DELETE')
+
+
+class MessageWatcher:
+    """
+    Incremental state of a watched message directory.
+
+    Every file is read up to its last complete line and remembered by byte offset together with its
+    year-inference state, so appended lines are parsed on their own and continue the file's years.
+    A last line without its newline is read once the file is unchanged for a poll or its writer
+    closed it (inotify CLOSE_WRITE), so an export that does not end in a newline is read in full.
+    Accounts keep their parsed transactions in report order (date, then file, then position in the
+    file, like the batch merge) alongside the verified copies and the verification checkpoint of
+    their last day. Appending to an account re-verifies from that checkpoint only; transactions that
+    land before it re-verify the account from the start. A file that shrinks, is replaced or
+    disappears triggers a full reload.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.reset()
+
+    def reset(self):
+        self.files = {}
+        # account number -> [(sort key, transaction)], the transactions as parsed.
+        self.parsed = defaultdict(list)
+        # account number -> verified copies in report order, and the verify_account checkpoint.
+        self.verified = {}
+        self.checkpoints = {}
+
+    def poll(self, closed=()):
+        """
+        Reads whatever was appended to the message files since the last poll and re-verifies the
+        accounts it touched.
+        Args:
+            closed (set): Names of files whose writer closed them since the last poll.
+        Returns:
+            dict: account number -> verified transactions, for every touched account.
+        """
+        message_dir = self.config['message_dir']
+        names = list_message_files(message_dir)
+        if any(name not in names for name in self.files):
+            logger.info('A message file was removed, reloading the message directory')
+            return self.reload()
+
+        new_transactions = []
+        for name in names:
+            path = os.path.join(message_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entry = self.files.get(name)
+            if entry is None:
+                entry = self.files[name] = {'offset': 0, 'state': {}, 'inode': stat.st_ino,
+                                            'rank': len(self.files), 'seq': 0}
+            elif stat.st_ino != entry['inode'] or stat.st_size < entry['offset']:
+                logger.info(f'{name} was rewritten, reloading the message directory')
+                return self.reload()
+            if stat.st_size > entry['offset']:
+                settled = name in closed or entry.get('pending') == (stat.st_size, stat.st_mtime_ns)
+                new_transactions.extend(self.read_appended(path, entry, stat.st_size if settled else None))
+                entry['pending'] = (stat.st_size, stat.st_mtime_ns) if stat.st_size > entry['offset'] else None
+
+        touched = set()
+        for key, transaction in new_transactions:
+            account_number = transaction['account_number']
+            parsed = self.parsed[account_number]
+            if parsed and key < parsed[-1][0]:
+                # Earlier than what was verified: the whole account is verified again.
+                self.checkpoints.pop(account_number, None)
+                insort(parsed, (key, transaction), key=lambda item: item[0])
+            else:
+                parsed.append((key, transaction))
+            touched.add(account_number)
+        return {account_number: self.verify(account_number) for account_number in touched}
+
+    def reload(self):
+        self.reset()
+        return self.poll()
+
+    def read_appended(self, path, entry, settled_size=None):
+        """
+        Parses the complete lines appended to one file since its recorded offset; a trailing partial
+        line is left for the next poll.
+        Args:
+            settled_size (int, optional): The size of a file that has stopped changing. If the file
+                still ends there, its last line counts as complete without a newline.
+        Returns:
+            list: (sort key, transaction) for the new transactions, in date order.
+        """
+        with open(path, 'rb') as file:
+            if 'encoding' not in entry:
+                entry['encoding'], entry['offset'] = detect_encoding(file.read(SAMPLE_SIZE))
+            file.seek(entry['offset'])
+            data = file.read()
+        end = find_line_end(data, entry['encoding'], 0, len(data))
+        if settled_size is not None and entry['offset'] + len(data) == settled_size:
+            end = len(data)
+        if not end:
+            return []
+        entry['offset'] += end
+        errors = self.config.get('decode_errors', 'replace')
+        bad_lines = []
+        lines = iter_buffer_lines(data, entry['encoding'], errors, bad_lines, end=end)
+        try:
+            keys = []
+            messages = list(iter_year_messages(lines, self.config['initial_year'], entry['state'], keys,
+                                               os.path.basename(path)))
+            _, messages = sort_file_messages(messages, os.path.basename(path), keys)
+        except UnicodeDecodeError as e:
+            logger.error(f"An error occurred while processing {os.path.basename(path)}: {e}")
+            return []
+        finally:
+            if bad_lines:
+                logger.warning(f"{os.path.basename(path)}: {len(bad_lines)} undecodable lines ({errors}) "
+                               f"at byte offsets {', '.join(str(entry['offset'] - end + offset) for offset, _ in bad_lines[:20])}")
+        transactions = []
+        for transaction in iter_extract_details(iter_extract_messages(messages, self.config['keywords'])):
+            transactions.append(((transaction['date'], entry['rank'], entry['seq']), transaction))
+            entry['seq'] += 1
+        return transactions
+
+    def verify(self, account_number):
+        """
+        Extends the account's verification from its last checkpoint.
+        Returns:
+            list: The account's verified transactions, in report order.
+        """
+        parsed = self.parsed[account_number]
+        checkpoint = self.checkpoints.get(account_number)
+        start = checkpoint['index'] if checkpoint else 0
+        verified = self.verified.get(account_number, [])[:start]
+        verified.extend(dict(transaction) for _, transaction in parsed[start:])
+        self.checkpoints[account_number] = verify_account(verified, self.config['threshold'], resume=checkpoint)
+        self.verified[account_number] = verified
+        return verified
+
+
+def wait_for_changes(message_dir, interval):
+    """
+    Returns a function that blocks until the message directory may have changed: inotify events
+    when the optional inotify_simple package is installed (Linux), otherwise a fixed polling interval.
+    The function returns the names of the files closed after writing (always empty when polling).
+    """
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        logger.info(f"inotify_simple not installed, polling {message_dir} every {interval}s")
+
+        def sleep():
+            time.sleep(interval)
+            return set()
+        return sleep
+
+    inotify = INotify()
+    mask = 0
+    for name in INOTIFY_EVENTS:
+        mask |= getattr(flags, name)
+    inotify.add_watch(message_dir, mask)
+
+    def wait():
+        # The timeout keeps the loop responsive to Ctrl-C; a short second read coalesces bursts of writes.
+        events = inotify.read(timeout=int(interval * 1000))
+        if events:
+            events += inotify.read(timeout=20)
+        return {event.name for event in events if event.mask & flags.CLOSE_WRITE}
+    return wait
+
+
+def run_watch(config, interval=0.25, max_polls=None):
+    """
+    Watches the message directory and keeps the reports up to date: new .txt files and lines
+    appended to existing ones are parsed, verified from each account's last checkpoint, and only
+    the accounts they touch are written to the configured sinks again. Runs until interrupted.
+    Args:
+        config (dict): The configuration parameters read from config.yaml.
+        interval (float): Seconds between polls without inotify, and the inotify wait timeout.
+        max_polls (int, optional): Stop after this many polls (for tests and benchmarks).
+    """
+    watcher = MessageWatcher(config)
+    wait = wait_for_changes(config['message_dir'], interval)
+    sinks = open_sinks(config)
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            closed = wait() if polls else set()
+            start = time.perf_counter()
+            updated = watcher.poll(closed)
+            for account_number, account_transactions in updated.items():
+                for sink in sinks:
+                    sink.write(account_number, account_transactions)
+            if updated:
+                logger.info(f"Watch: re-exported {len(updated)} accounts "
+                            f"({sum(map(len, updated.values()))} transactions) in {time.perf_counter() - start:.3f}s")
+            polls += 1
+    except KeyboardInterrupt:
+        logger.info('Watch mode stopped')
+    finally:
+        close_sinks(sinks)